@@ -0,0 +1,313 @@
+"""语料级聚合模块
+
+为多对话（多进程）运行提供可合并的聚合统计：幻觉类型计数、严重程度直方图、
+最常使用/最常遗漏记忆的Top-K（Space-Saving热点草图）、按轮次距离的记忆衰减曲线，
+以及抽样模式下用于语料级幻觉率区间估计的分层计数。
+所有结构大小与语料规模无关，可在进程间序列化后合并。
+"""
+
+import json
+from dataclasses import asdict, dataclass, field
+from typing import Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+from .decay import DecayCurves, MAX_DISTANCE_BUCKET, bucket_range, distance_bucket
+from .hallucination import HallucinationType
+from .memory_state import MemoryState
+from .sampling import RateEstimate, StratumCounts, estimate_rate, stratum_counts
+
+
+SEVERITY_BINS = 10  # 严重程度直方图分箱数，[0.0, 0.1), [0.1, 0.2), ... [0.9, 1.0]
+
+
+class SpaceSaving:
+    """Space-Saving热点草图：固定容量下估计出现次数最多的元素，支持合并"""
+
+    def __init__(self, capacity: int = 100):
+        self.capacity = capacity
+        self.counts: Dict[str, int] = {}
+        self.errors: Dict[str, int] = {}  # 计数的最大高估量
+
+    def add(self, item: str, count: int = 1) -> None:
+        """记录元素出现count次"""
+        if item in self.counts:
+            self.counts[item] += count
+            return
+        if len(self.counts) < self.capacity:
+            self.counts[item] = count
+            self.errors[item] = 0
+            return
+        # 替换当前计数最小的元素，继承其计数作为误差上界
+        victim = min(self.counts, key=self.counts.__getitem__)
+        floor = self.counts.pop(victim)
+        self.errors.pop(victim)
+        self.counts[item] = floor + count
+        self.errors[item] = floor
+
+    def merge(self, other: 'SpaceSaving') -> None:
+        """合并另一个草图（Agarwal等人的可合并Space-Saving）"""
+        floor_self = self._floor()
+        floor_other = other._floor()
+        counts = {}
+        errors = {}
+        for item in set(self.counts) | set(other.counts):
+            counts[item] = (self.counts.get(item, floor_self)
+                            + other.counts.get(item, floor_other))
+            errors[item] = (self.errors.get(item, floor_self)
+                            + other.errors.get(item, floor_other))
+        kept = sorted(counts, key=counts.__getitem__, reverse=True)[:self.capacity]
+        self.counts = {item: counts[item] for item in kept}
+        self.errors = {item: errors[item] for item in kept}
+
+    def top(self, k: int = 10) -> List[Tuple[str, int, int]]:
+        """返回估计计数最高的k个元素 [(元素, 估计计数, 误差上界)]"""
+        items = sorted(self.counts.items(), key=lambda x: x[1], reverse=True)[:k]
+        return [(item, count, self.errors[item]) for item, count in items]
+
+    def _floor(self) -> int:
+        """草图已满时，未记录元素的计数上界"""
+        if len(self.counts) < self.capacity:
+            return 0
+        return min(self.counts.values())
+
+    def to_dict(self) -> Dict:
+        return {
+            "capacity": self.capacity,
+            "items": [[item, count, self.errors[item]] for item, count in self.counts.items()]
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> 'SpaceSaving':
+        sketch = cls(capacity=data["capacity"])
+        for item, count, error in data["items"]:
+            sketch.counts[item] = count
+            sketch.errors[item] = error
+        return sketch
+
+
+@dataclass
+class CorpusAggregate:
+    """可合并的语料级聚合统计"""
+    dialogues: int = 0
+    turns: int = 0  # 完整分析的轮次数
+    skipped_turns: int = 0  # 抽样跳过的轮次数
+    memories: int = 0
+    hallucination_counts: Dict[str, int] = field(default_factory=dict)  # {幻觉类型: 次数}
+    severity_histogram: List[int] = field(default_factory=lambda: [0] * SEVERITY_BINS)
+    most_used: SpaceSaving = field(default_factory=SpaceSaving)
+    most_missed: SpaceSaving = field(default_factory=SpaceSaving)
+    # 记忆衰减曲线：{距离分桶: 次数}，使用概率 = decay_used / decay_exposed
+    decay_exposed: Dict[int, int] = field(default_factory=dict)
+    decay_used: Dict[int, int] = field(default_factory=dict)
+    # 按类别/重要性分组的记忆保持率曲线，直接合并各对话增量维护的结果
+    decay_groups: DecayCurves = field(default_factory=DecayCurves)
+    # 幻觉率估计的分层计数：{"all"或幻觉类型: {层标签: 计数}}
+    strata: Dict[str, Dict[str, StratumCounts]] = field(default_factory=dict)
+
+    def add_state(self, state: MemoryState) -> None:
+        """累加一个对话的分析结果"""
+        self.dialogues += 1
+        self.turns += len(state.turns)
+        self.skipped_turns += len(state.skipped_turns)
+        self.memories += len(state.memories)
+        self.decay_groups.merge(state.decay)
+
+        for hall_type in (None,) + tuple(HallucinationType):
+            _merge_strata(self.strata.setdefault(_rate_key(hall_type), {}),
+                          stratum_counts([state], hall_type))
+
+        # 按产生轮次统计记忆数量的前缀和，用于O(分桶数)计算每轮的暴露次数
+        created: Dict[int, int] = {}
+        for mem in state.memories:
+            created[mem.turn_id] = created.get(mem.turn_id, 0) + 1
+        max_turn = max([t.turn_id for t in state.turns] + list(created) + [0])
+        prefix = [0] * (max_turn + 1)  # prefix[t] = 产生于轮次 <= t 的记忆数
+        running = 0
+        for t in range(max_turn + 1):
+            running += created.get(t, 0)
+            prefix[t] = running
+
+        for turn in state.turns:
+            for bucket in range(MAX_DISTANCE_BUCKET + 1):
+                lo, hi = bucket_range(bucket)
+                newest = turn.turn_id - lo
+                if newest < 0:
+                    break
+                oldest = 0 if hi is None else max(turn.turn_id - hi, 0)
+                exposed = prefix[newest] - (prefix[oldest - 1] if oldest > 0 else 0)
+                if exposed:
+                    self.decay_exposed[bucket] = self.decay_exposed.get(bucket, 0) + exposed
+
+            for mem_id in turn.used_memories:
+                mem = state.get_memory_by_id(mem_id)
+                if mem:
+                    self.most_used.add(mem.content)
+                    bucket = distance_bucket(turn.turn_id - mem.turn_id)
+                    self.decay_used[bucket] = self.decay_used.get(bucket, 0) + 1
+            for mem_id in turn.missed_memories:
+                mem = state.get_memory_by_id(mem_id)
+                if mem:
+                    self.most_missed.add(mem.content)
+
+            for hall in turn.hallucinations:
+                hall_type = hall.type.value
+                self.hallucination_counts[hall_type] = self.hallucination_counts.get(hall_type, 0) + 1
+                index = min(int(max(hall.severity, 0.0) * SEVERITY_BINS), SEVERITY_BINS - 1)
+                self.severity_histogram[index] += 1
+
+    def merge(self, other: 'CorpusAggregate') -> None:
+        """合并另一个聚合结果（如其他worker进程的结果）"""
+        self.dialogues += other.dialogues
+        self.turns += other.turns
+        self.skipped_turns += other.skipped_turns
+        self.memories += other.memories
+        for hall_type, count in other.hallucination_counts.items():
+            self.hallucination_counts[hall_type] = self.hallucination_counts.get(hall_type, 0) + count
+        for i, count in enumerate(other.severity_histogram):
+            self.severity_histogram[i] += count
+        self.most_used.merge(other.most_used)
+        self.most_missed.merge(other.most_missed)
+        for bucket, count in other.decay_exposed.items():
+            self.decay_exposed[bucket] = self.decay_exposed.get(bucket, 0) + count
+        for bucket, count in other.decay_used.items():
+            self.decay_used[bucket] = self.decay_used.get(bucket, 0) + count
+        self.decay_groups.merge(other.decay_groups)
+        for key, strata in other.strata.items():
+            _merge_strata(self.strata.setdefault(key, {}), strata)
+
+    def hallucination_rate(self, hallucination_type: Optional[HallucinationType] = None,
+                           confidence: float = 0.95) -> RateEstimate:
+        """语料级的幻觉轮次比例估计（抽样模式下带置信区间）"""
+        return estimate_rate(self.strata.get(_rate_key(hallucination_type), {}),
+                             confidence=confidence)
+
+    def decay_curve(self) -> List[Tuple[int, Optional[int], float, int]]:
+        """返回记忆衰减曲线 [(距离下界, 距离上界, 使用概率, 暴露次数)]"""
+        curve = []
+        for bucket in sorted(self.decay_exposed):
+            exposed = self.decay_exposed[bucket]
+            lo, hi = bucket_range(bucket)
+            curve.append((lo, hi, self.decay_used.get(bucket, 0) / exposed, exposed))
+        return curve
+
+    def to_dict(self) -> Dict:
+        return {
+            "dialogues": self.dialogues,
+            "turns": self.turns,
+            "skipped_turns": self.skipped_turns,
+            "memories": self.memories,
+            "hallucination_counts": dict(self.hallucination_counts),
+            "severity_histogram": list(self.severity_histogram),
+            "most_used": self.most_used.to_dict(),
+            "most_missed": self.most_missed.to_dict(),
+            # JSON的键只能是字符串
+            "decay_exposed": {str(k): v for k, v in self.decay_exposed.items()},
+            "decay_used": {str(k): v for k, v in self.decay_used.items()},
+            "decay_groups": self.decay_groups.to_dict(),
+            "strata": {k: {label: asdict(counts) for label, counts in v.items()}
+                       for k, v in self.strata.items()},
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> 'CorpusAggregate':
+        return cls(
+            dialogues=data["dialogues"],
+            turns=data["turns"],
+            skipped_turns=data["skipped_turns"],
+            memories=data["memories"],
+            hallucination_counts=dict(data["hallucination_counts"]),
+            severity_histogram=list(data["severity_histogram"]),
+            most_used=SpaceSaving.from_dict(data["most_used"]),
+            most_missed=SpaceSaving.from_dict(data["most_missed"]),
+            decay_exposed={int(k): v for k, v in data["decay_exposed"].items()},
+            decay_used={int(k): v for k, v in data["decay_used"].items()},
+            decay_groups=DecayCurves.from_dict(data["decay_groups"]),
+            strata={k: {label: StratumCounts(**counts) for label, counts in v.items()}
+                    for k, v in data["strata"].items()},
+        )
+
+
+def _rate_key(hallucination_type: Optional[HallucinationType]) -> str:
+    return hallucination_type.value if hallucination_type else "all"
+
+
+def _merge_strata(target: Dict[str, StratumCounts], strata: Dict[str, StratumCounts]) -> None:
+    for label, counts in strata.items():
+        target.setdefault(label, StratumCounts()).merge(counts)
+
+
+def iter_dialogue_files(filepaths: Iterable[str]) -> Iterable[Dict]:
+    """逐个读取对话文件，任何时候只持有一个对话"""
+    for filepath in filepaths:
+        with open(filepath, 'r', encoding='utf-8') as f:
+            yield json.load(f)
+
+
+def _aggregate_file(task: Tuple[str, Optional[Set[int]]]) -> Dict:
+    """worker进程：分析单个对话文件，返回可序列化的聚合结果"""
+    filepath, selected_turns = task
+    aggregate = CorpusAggregate()
+    aggregate.add_state(_analyze_file(filepath, None, selected_turns))
+    return aggregate.to_dict()
+
+
+def _analyze_file(filepath: str, analyzer_factory: Optional[Callable],
+                  selected_turns: Optional[Set[int]] = None) -> MemoryState:
+    """单进程/多线程模式：分析单个对话文件"""
+    from .analyzer import LLMMemoryAnalyzer
+
+    with open(filepath, 'r', encoding='utf-8') as f:
+        dialogue_data = json.load(f)
+    analyzer = analyzer_factory() if analyzer_factory else LLMMemoryAnalyzer()
+    return analyzer.analyze_dialogue(dialogue_data, selected_turns=selected_turns)
+
+
+def aggregate_corpus(filepaths: Iterable[str], workers: int = 1,
+                     analyzer_factory: Optional[Callable] = None,
+                     selection: Optional[Dict[int, Set[int]]] = None) -> CorpusAggregate:
+    """
+    分析一批对话文件并合并为语料级聚合结果
+
+    Args:
+        filepaths: 对话JSON文件路径
+        workers: 并行数。大于1时：未提供analyzer_factory则使用多进程（每个进程使用模拟分析）；
+                 提供了analyzer_factory则使用多线程，LLM分析以等待网络为主，
+                 各线程共享同一个客户端的连接池和微批处理
+        analyzer_factory: 创建分析器的工厂函数，便于使用带LLM客户端或抽样器的分析器
+        selection: 语料级抽样结果 {文件序号: 需要完整分析的轮次ID集合}（如
+                   ``reservoir_sample_turns`` 的结果），未出现的文件只做启发式记忆提取
+
+    Returns:
+        合并后的CorpusAggregate，内存占用与语料规模无关
+    """
+    tasks = (
+        (filepath, None if selection is None else selection.get(index, set()))
+        for index, filepath in enumerate(filepaths)
+    )
+    total = CorpusAggregate()
+    if workers > 1 and analyzer_factory is None:
+        from multiprocessing import Pool
+
+        with Pool(workers) as pool:
+            for data in pool.imap_unordered(_aggregate_file, tasks):
+                total.merge(CorpusAggregate.from_dict(data))
+        return total
+
+    if workers > 1:
+        from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+        with ThreadPoolExecutor(workers) as executor:
+            pending = set()
+            for filepath, selected_turns in tasks:
+                # 限制在途任务数，避免一次性提交全部文件
+                if len(pending) >= workers * 2:
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        total.add_state(future.result())
+                pending.add(executor.submit(_analyze_file, filepath, analyzer_factory, selected_turns))
+            for future in pending:
+                total.add_state(future.result())
+        return total
+
+    for filepath, selected_turns in tasks:
+        total.add_state(_analyze_file(filepath, analyzer_factory, selected_turns))
+    return total
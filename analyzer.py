@@ -1,30 +1,73 @@
 """主分析逻辑模块"""
 
-import json
-import re
-from typing import List, Dict, Optional
+from typing import List, Dict, Optional, Set
 from .memory_state import MemoryState, TurnAnalysis, MemoryItem
 from .hallucination import Hallucination, HallucinationType, HallucinationDetector
-from .prompt import PromptBuilder
+from .prompt import PromptBuilder, PrefixReuseMeter, history_window_turns
+from .budget import AnalysisBudget, BudgetTracker, estimate_tokens
+from .json_stream import IncrementalJSONParser, parse_json_response
+from .sampling import POOLED_STRATUM, iter_turn_ids
+from .facts import extract_slots, find_contradictions, parse_slot
+from .history_index import HistoryIndex
+from .segment import KeywordExtractor, find_keyword
+
+
+def _score(value, default: float) -> float:
+    """把LLM输出的0-1分值转换为浮点数，无法解析时使用默认值，超出范围时截断"""
+    if isinstance(value, bool):
+        return default
+    try:
+        score = float(value)
+    except (TypeError, ValueError):
+        return default
+    if score != score:  # NaN
+        return default
+    return min(max(score, 0.0), 1.0)
 
 
 class LLMMemoryAnalyzer:
     """LLM记忆分析器"""
     
-    def __init__(self, llm_client=None):
+    def __init__(self, llm_client=None, sampler=None,
+                 budget: Optional[AnalysisBudget] = None, json_retries: int = 1,
+                 prompt_layout: str = "default", segmenter=None,
+                 history_window: Optional[int] = None):
         """
         初始化分析器
         
         Args:
             llm_client: LLM客户端，需要实现call方法
                         如果为None，将使用模拟分析（用于测试）
+            sampler: 轮次抽样器（TurnSampler），为None时分析所有轮次
+            budget: 单个对话的分析预算，超出时降级为截断历史或启发式分析；
+                    设置deadline时，call/stream需接受timeout关键字参数（剩余秒数）
+            json_retries: LLM输出完全无法解析为JSON时的定向重试次数
+                          （客户端实现stream方法时使用流式调用，JSON对象闭合即停止生成）
+            prompt_layout: 分析Prompt布局，"prefix_stable" 使同一对话各轮的Prompt共享
+                           逐字节一致的前缀，便于Prompt/KV缓存
+            segmenter: 关键词提取使用的分词器（实现segment方法），默认使用内置词典最大匹配
+            history_window: 分析Prompt只保留最近N轮历史，为None时保留全部历史
         """
+        if prompt_layout not in PromptBuilder.LAYOUTS:
+            raise ValueError(f"未知的Prompt布局: {prompt_layout}")
+        if history_window is not None and history_window < 1:
+            raise ValueError(f"历史窗口必须为正整数: {history_window}")
         self.llm_client = llm_client
+        self.sampler = sampler
+        self.budget = budget
+        self.budget_tracker: Optional[BudgetTracker] = None
+        self.json_retries = json_retries
+        self.prompt_layout = prompt_layout
+        self.history_window = history_window
+        self.prefix_meter = PrefixReuseMeter()
+        self.keyword_extractor = KeywordExtractor(segmenter)
         self.prompt_builder = PromptBuilder()
         self.hallucination_detector = HallucinationDetector()
         self.memory_state = MemoryState()
+        self.history_index = HistoryIndex()
     
-    def analyze_dialogue(self, dialogue_data: Dict) -> MemoryState:
+    def analyze_dialogue(self, dialogue_data: Dict,
+                         selected_turns: Optional[Set[int]] = None) -> MemoryState:
         """
         分析整个对话
         
@@ -37,12 +80,24 @@ class LLMMemoryAnalyzer:
                         ...
                     ]
                 }
+            selected_turns: 需要完整分析的轮次ID集合（如蓄水池抽样的结果），
+                            为None时由sampler决定，两者都没有则分析全部轮次
         
         Returns:
             MemoryState对象，包含完整的分析结果
         """
         turns = dialogue_data.get("turns", [])
         history = []
+        self.history_index = HistoryIndex()
+        self.prefix_meter.reset()
+        self.budget_tracker = BudgetTracker(self.budget) if self.budget else None
+        
+        turn_ids = list(iter_turn_ids(dialogue_data))
+        if selected_turns is None and self.sampler is not None:
+            selected_turns, strata = self.sampler.select(turn_ids)
+            self.memory_state.turn_strata.update(strata)
+        elif selected_turns is not None:
+            self.memory_state.turn_strata.update({t: POOLED_STRATUM for t in turn_ids})
         
         # 按轮次分析（每两轮为一组：user + assistant）
         for i in range(0, len(turns), 2):
@@ -58,32 +113,46 @@ class LLMMemoryAnalyzer:
             turn_id = i // 2 + 1
             user_input = user_turn.get("content", "")
             llm_response = assistant_turn.get("content", "")
+            sampled = selected_turns is None or turn_id in selected_turns
+            if sampled and self.budget_tracker:
+                self.budget_tracker.start_turn()
             
-            # 提取当前轮次的记忆
-            memories = self._extract_memories(turn_id, user_input, llm_response)
+            # 提取当前轮次的记忆（未抽中的轮次使用启发式提取，保持记忆状态一致）
+            if sampled:
+                memories = self._extract_memories(turn_id, user_input, llm_response)
+            else:
+                memories = self._simulate_memory_extraction(user_input, llm_response)
             memory_ids = []
             for mem in memories:
                 mem_id = self.memory_state.add_memory(
                     turn_id=turn_id,
                     content=mem["content"],
                     importance=mem["importance"],
-                    category=mem["category"]
+                    category=mem["category"],
+                    slot=mem.get("slot"),
+                    value=mem.get("value")
                 )
                 memory_ids.append(mem_id)
             
-            # 分析当前轮次
-            analysis = self._analyze_turn(
-                turn_id=turn_id,
-                user_input=user_input,
-                llm_response=llm_response,
-                history=history.copy()
-            )
+            # 当前用户输入也计入历史索引，"你刚才说..."可以指向本轮输入
+            self.history_index.add("user", user_input)
             
-            self.memory_state.turns.append(analysis)
+            # 分析当前轮次
+            if sampled:
+                analysis = self._analyze_turn(
+                    turn_id=turn_id,
+                    user_input=user_input,
+                    llm_response=llm_response,
+                    history=history.copy()
+                )
+                self.memory_state.record_turn(analysis)
+            else:
+                self.memory_state.skipped_turns.append(turn_id)
             
             # 更新历史
-            history.append({"role": "user", "content": user_input})
-            history.append({"role": "assistant", "content": llm_response})
+            history.append({"role": "user", "content": user_input, "turn_id": turn_id})
+            history.append({"role": "assistant", "content": llm_response, "turn_id": turn_id})
+            self.history_index.add("assistant", llm_response)
         
         return self.memory_state
     
@@ -93,87 +162,235 @@ class LLMMemoryAnalyzer:
             prompt = self.prompt_builder.build_memory_extraction_prompt(
                 turn_id, user_input, llm_response
             )
-            response = self.llm_client.call(prompt)
-            try:
-                result = json.loads(response)
-                return result.get("memories", [])
-            except:
-                return []
+            reason = self._reserve_llm_call(prompt)
+            if reason:
+                self._record_degradation(turn_id, f"记忆提取降级为启发式（{reason}）")
+                return self._simulate_memory_extraction(user_input, llm_response)
+            self.prefix_meter.record("memory_extraction", turn_id, prompt)
+            result = self._call_llm_json(turn_id, prompt, ["memories"])
+            if result is None:
+                self._record_degradation(turn_id, "记忆提取输出无法解析，降级为启发式")
+                return self._simulate_memory_extraction(user_input, llm_response)
+            memories = []
+            for mem in result.get("memories", []):
+                if not isinstance(mem, dict) or not mem.get("content"):
+                    continue
+                content = str(mem["content"])
+                slot_value = parse_slot(content)
+                memories.append({
+                    "content": content,
+                    "importance": _score(mem.get("importance"), 0.5),
+                    "category": mem.get("category", "context"),
+                    "slot": slot_value[0] if slot_value else None,
+                    "value": slot_value[1] if slot_value else None
+                })
+            # LLM输出的内容未必是"标签: 值"格式，槽位仍按定义从用户输入补齐，保证事实表有值
+            covered = {mem["slot"] for mem in memories if mem["slot"]}
+            for mem in self._simulate_memory_extraction(user_input, llm_response):
+                if mem["slot"] not in covered:
+                    memories.append(mem)
+            return memories
         else:
             # 模拟提取（用于测试）
             return self._simulate_memory_extraction(user_input, llm_response)
     
     def _simulate_memory_extraction(self, user_input: str, llm_response: str) -> List[Dict]:
-        """模拟记忆提取（用于测试）"""
+        """模拟记忆提取（用于测试）：按事实槽位定义匹配用户输入"""
         memories = []
-        
-        # 提取姓名
-        import re
-        name_patterns = [
-            r"我叫([\u4e00-\u9fa5]+)",
-            r"我是([\u4e00-\u9fa5]+)",
-            r"我的名字是([\u4e00-\u9fa5]+)"
-        ]
-        for pattern in name_patterns:
-            match = re.search(pattern, user_input)
-            if match:
-                name = match.group(1)
-                memories.append({
-                    "content": f"用户姓名: {name}",
-                    "importance": 0.9,
-                    "category": "fact"
-                })
-                break
-        
-        # 提取地点信息
-        location_patterns = [
-            r"我来自([\u4e00-\u9fa5]+)",
-            r"我在([\u4e00-\u9fa5]+)",
-            r"我是([\u4e00-\u9fa5]+)人"
-        ]
-        for pattern in location_patterns:
-            match = re.search(pattern, user_input)
-            if match:
-                location = match.group(1)
-                memories.append({
-                    "content": f"用户来自: {location}",
-                    "importance": 0.9,
-                    "category": "fact"
-                })
-                break
-        
-        # 提取偏好信息
-        if "喜欢" in user_input or "爱好" in user_input or "兴趣" in user_input:
-            # 提取"喜欢"后面的内容
-            like_match = re.search(r"喜欢([^，。！？]+)", user_input)
-            if like_match:
-                preference = like_match.group(1).strip()
-                memories.append({
-                    "content": user_input,
-                    "importance": 0.7,
-                    "category": "preference"
-                })
-        
+        for slot, value in extract_slots(user_input, self.memory_state.facts):
+            # 偏好类记忆保留原句，便于后续关键词匹配
+            content = user_input if slot.category == "preference" else f"{slot.label}: {value}"
+            memories.append({
+                "content": content,
+                "importance": slot.importance,
+                "category": slot.category,
+                "slot": slot.name,
+                "value": value
+            })
         return memories
     
     def _analyze_turn(self, turn_id: int, user_input: str, 
                      llm_response: str, history: List[Dict]) -> TurnAnalysis:
         """分析单轮对话"""
         if self.llm_client:
-            prompt = self.prompt_builder.build_analysis_prompt(
-                turn_id, user_input, llm_response, history
+            prompt = self._build_analysis_prompt(turn_id, user_input, llm_response, history)
+            reason = self._reserve_llm_call(prompt)
+            if reason == "max_prompt_tokens" and history:
+                # 先尝试截断历史以适应剩余的token预算
+                truncated = self._truncate_history(turn_id, user_input, llm_response, history)
+                if truncated is not None:
+                    prompt = self._build_analysis_prompt(turn_id, user_input, llm_response, truncated)
+                    reason = self._reserve_llm_call(prompt)
+                    if not reason:
+                        self._record_degradation(
+                            turn_id, f"历史截断为最近 {len(truncated) // 2} 轮（max_prompt_tokens）"
+                        )
+            if reason:
+                self._record_degradation(turn_id, f"轮次分析降级为启发式（{reason}）")
+                return self._simulate_analysis(turn_id, user_input, llm_response, history)
+            self.prefix_meter.record("analysis", turn_id, prompt)
+            result = self._call_llm_json(
+                turn_id, prompt, ["used_memories", "missed_memories", "hallucinations"]
             )
-            response = self.llm_client.call(prompt)
-            try:
-                result = json.loads(response)
-                return self._parse_analysis_result(turn_id, user_input, llm_response, result)
-            except Exception as e:
-                print(f"分析轮次 {turn_id} 时出错: {e}")
-                return TurnAnalysis(turn_id=turn_id, user_input=user_input, llm_response=llm_response)
+            if result is not None:
+                try:
+                    return self._parse_analysis_result(turn_id, user_input, llm_response, result)
+                except Exception as e:
+                    print(f"分析轮次 {turn_id} 时出错: {e}")
+            self._record_degradation(turn_id, "轮次分析输出无法解析，降级为启发式")
+            return self._simulate_analysis(turn_id, user_input, llm_response, history)
         else:
             # 模拟分析（用于测试）
             return self._simulate_analysis(turn_id, user_input, llm_response, history)
     
+    def _build_analysis_prompt(self, turn_id: int, user_input: str,
+                               llm_response: str, history: List[Dict]) -> str:
+        """按配置的布局构建分析Prompt，配置了历史窗口时只保留最近的轮次"""
+        history = self._windowed_history(history)
+        memories = self._prompt_memories(turn_id, history)
+        if self.prompt_layout == "prefix_stable":
+            return self.prompt_builder.build_prefix_stable_analysis_prompt(
+                turn_id, user_input, llm_response, history, memories
+            )
+        return self.prompt_builder.build_analysis_prompt(
+            turn_id, user_input, llm_response, history, memories
+        )
+    
+    def _windowed_history(self, history: List[Dict]) -> List[Dict]:
+        """按历史窗口保留最近的整轮历史"""
+        keep = history_window_turns(len(history) // 2, self.history_window, self.prompt_layout)
+        return history[len(history) - 2 * keep:]
+    
+    def _prompt_memories(self, turn_id: int, history: List[Dict]) -> List[Dict]:
+        """Prompt中列出的记忆项：来自所给历史中的轮次及当前轮次，LLM按其编号输出memory_id"""
+        turns = {item.get("turn_id", i // 2 + 1) for i, item in enumerate(history)}
+        turns.add(turn_id)
+        return [
+            {"memory_id": mem_id, "turn_id": mem.turn_id, "content": mem.content}
+            for mem_id, mem in enumerate(self.memory_state.memories)
+            if mem.turn_id in turns
+        ]
+    
+    def _call_llm_json(self, turn_id: int, prompt: str, keys: List[str]) -> Optional[Dict]:
+        """
+        调用LLM并解析JSON输出
+        
+        输出不完整时使用抢救出的数组条目；什么也没抢救到时发起定向重试。
+        
+        Returns:
+            解析结果，重试后仍失败或预算不足以重试时返回None
+        """
+        response = self._complete_or_none(turn_id, prompt)
+        if response is None:
+            return None
+        for attempt in range(self.json_retries + 1):
+            result, complete = parse_json_response(response, keys)
+            if result is not None:
+                if not complete:
+                    self._record_degradation(turn_id, "JSON输出不完整，仅保留可解析的条目")
+                return result
+            if attempt == self.json_retries:
+                break
+            retry_prompt = self.prompt_builder.build_json_retry_prompt(prompt, response)
+            if self._reserve_llm_call(retry_prompt):
+                break
+            response = self._complete_or_none(turn_id, retry_prompt)
+            if response is None:
+                break
+        return None
+    
+    def _complete_or_none(self, turn_id: int, prompt: str) -> Optional[str]:
+        """调用LLM，请求失败（超时、连接断开等）时记录降级并返回None"""
+        try:
+            return self._complete(prompt)
+        except Exception as e:
+            self._record_degradation(turn_id, f"LLM调用失败: {e}")
+            return None
+    
+    def _complete(self, prompt: str) -> str:
+        """
+        调用LLM；客户端支持stream时流式读取，顶层JSON对象闭合后立即停止生成
+        
+        设置了deadline时，剩余时间作为timeout关键字参数传给客户端，
+        流式读取超过deadline时中断并抛出TimeoutError
+        """
+        tracker = self.budget_tracker
+        remaining = tracker.remaining_seconds() if tracker else None
+        if remaining == 0:
+            raise TimeoutError("已超过deadline")
+        kwargs = {} if remaining is None else {"timeout": remaining}
+        stream = getattr(self.llm_client, "stream", None)
+        if stream is None:
+            return self.llm_client.call(prompt, **kwargs)
+        parser = IncrementalJSONParser()
+        chunks = stream(prompt, **kwargs)
+        try:
+            for chunk in chunks:
+                if parser.feed(chunk):
+                    break
+                if remaining is not None and tracker.remaining_seconds() == 0:
+                    raise TimeoutError("流式输出超过deadline")
+        finally:
+            # 关闭生成器以中断底层的流式请求
+            close = getattr(chunks, "close", None)
+            if close:
+                close()
+        return parser.text
+    
+    def _reserve_llm_call(self, prompt: str) -> Optional[str]:
+        """
+        在预算内预留一次LLM调用
+        
+        Returns:
+            预算不足时返回耗尽的预算名称，否则记账并返回None
+        """
+        tracker = self.budget_tracker
+        if tracker is None:
+            return None
+        reason = tracker.exhausted()
+        if reason:
+            return reason
+        tokens = estimate_tokens(prompt)
+        remaining = tracker.remaining_tokens()
+        if remaining is not None and tokens > remaining:
+            return "max_prompt_tokens"
+        tracker.charge(tokens)
+        return None
+    
+    def _truncate_history(self, turn_id: int, user_input: str, llm_response: str,
+                          history: List[Dict]) -> Optional[List[Dict]]:
+        """
+        按整轮（user + assistant）丢弃最早的历史，使prompt适应剩余token预算
+        
+        Returns:
+            截断后的历史，即使不保留任何历史也放不下时返回None
+        """
+        remaining = self.budget_tracker.remaining_tokens()
+        history = self._windowed_history(history)
+        
+        def fits(turns: int) -> bool:
+            # 按实际渲染的Prompt估算（含轮次编号和记忆项），与预留调用时的估算一致
+            prompt = self._build_analysis_prompt(
+                turn_id, user_input, llm_response, history[len(history) - 2 * turns:]
+            )
+            return estimate_tokens(prompt) <= remaining
+        
+        if not fits(0):
+            return None
+        # 保留的轮数越多prompt越长，二分查找能放下的最长后缀
+        lo, hi = 0, len(history) // 2
+        while lo < hi:
+            mid = (lo + hi + 1) // 2
+            if fits(mid):
+                lo = mid
+            else:
+                hi = mid - 1
+        return history[len(history) - 2 * lo:]
+    
+    def _record_degradation(self, turn_id: int, note: str):
+        """记录某轮次降级的分析方式（预算不足、输出无法解析或调用失败）"""
+        self.memory_state.degraded_turns.setdefault(turn_id, []).append(note)
+    
     def _parse_analysis_result(self, turn_id: int, user_input: str, 
                               llm_response: str, result: Dict) -> TurnAnalysis:
         """解析分析结果"""
@@ -185,19 +402,25 @@ class LLMMemoryAnalyzer:
         
         # 解析使用的记忆
         for mem in result.get("used_memories", []):
-            mem_id = mem.get("memory_id")
+            if not isinstance(mem, dict):
+                continue
+            mem_id = self._memory_id(mem.get("memory_id"))
             if mem_id is not None:
                 analysis.used_memories.append(mem_id)
                 analysis.memory_references[mem_id] = mem.get("reference_text", "")
         
         # 解析遗漏的记忆
         for mem in result.get("missed_memories", []):
-            mem_id = mem.get("memory_id")
+            if not isinstance(mem, dict):
+                continue
+            mem_id = self._memory_id(mem.get("memory_id"))
             if mem_id is not None:
                 analysis.missed_memories.append(mem_id)
         
         # 解析幻觉
         for hall in result.get("hallucinations", []):
+            if not isinstance(hall, dict):
+                continue
             hall_type_str = hall.get("type", "")
             try:
                 hall_type = HallucinationType(hall_type_str)
@@ -209,13 +432,27 @@ class LLMMemoryAnalyzer:
                 turn_id=turn_id,
                 description=hall.get("description", ""),
                 evidence=hall.get("evidence", ""),
-                severity=hall.get("severity", 0.5),
+                severity=_score(hall.get("severity"), 0.5),
                 suggested_correction=hall.get("suggested_correction")
             )
             analysis.hallucinations.append(hallucination)
         
         return analysis
     
+    def _memory_id(self, value) -> Optional[int]:
+        """把LLM给出的记忆ID转换为整数（兼容 "0"、0.0 等写法），无效或不存在时返回None"""
+        if isinstance(value, bool):
+            return None
+        if isinstance(value, str):
+            value = value.strip().lstrip("#")
+        try:
+            mem_id = int(value)
+        except (TypeError, ValueError):
+            return None
+        if isinstance(value, float) and value != mem_id:
+            return None
+        return mem_id if self.memory_state.get_memory_by_id(mem_id) else None
+    
     def _simulate_analysis(self, turn_id: int, user_input: str,
                           llm_response: str, history: List[Dict]) -> TurnAnalysis:
         """模拟分析（用于测试）"""
@@ -229,56 +466,45 @@ class LLMMemoryAnalyzer:
         available_memories = [m.content for m in self.memory_state.memories]
         
         # 检查是否使用了历史信息
+        response_lower = llm_response.lower()
+        user_lower = user_input.lower()
         for i, mem in enumerate(self.memory_state.memories):
-            # 提取记忆中的关键信息
+            # 提取记忆中的关键信息（按文本缓存，每条记忆只分词一次）
             mem_keywords = self._extract_keywords(mem.content)
-            response_lower = llm_response.lower()
             
             # 检查是否引用了记忆
-            if any(kw in response_lower for kw in mem_keywords if len(kw) > 2):
+            if any(find_keyword(response_lower, kw) != -1 for kw in mem_keywords):
                 analysis.used_memories.append(i)
                 # 找到引用片段
                 for kw in mem_keywords:
-                    if kw in response_lower and len(kw) > 2:
-                        idx = response_lower.find(kw)
-                        if idx != -1:
-                            start = max(0, idx - 20)
-                            end = min(len(llm_response), idx + len(kw) + 20)
-                            analysis.memory_references[i] = llm_response[start:end]
-                            break
+                    idx = find_keyword(response_lower, kw)
+                    if idx != -1:
+                        start = max(0, idx - 20)
+                        end = min(len(llm_response), idx + len(kw) + 20)
+                        analysis.memory_references[i] = llm_response[start:end]
+                        break
         
         # 检查遗漏的关键记忆
         for i, mem in enumerate(self.memory_state.memories):
             if mem.importance > 0.7 and i not in analysis.used_memories:
                 # 检查是否应该被使用（用户询问相关话题）
                 mem_keywords = self._extract_keywords(mem.content)
-                user_lower = user_input.lower()
-                if any(kw in user_lower for kw in mem_keywords if len(kw) > 2):
+                if any(find_keyword(user_lower, kw) != -1 for kw in mem_keywords):
                     analysis.missed_memories.append(i)
         
         # 检测错误引用类型的幻觉
-        # 检查LLM是否给出了与记忆不符的答案
-        for i, mem in enumerate(self.memory_state.memories):
-            if mem.category == "fact" and mem.importance > 0.7:
-                mem_keywords = self._extract_keywords(mem.content)
-                user_lower = user_input.lower()
-                response_lower = llm_response.lower()
-                
-                # 如果用户询问相关话题，但LLM给出了错误答案
-                if any(kw in user_lower for kw in ["来自", "城市", "哪里", "哪"]):
-                    # 检查记忆中的城市名
-                    if "北京" in mem.content:
-                        if "上海" in response_lower or "广州" in response_lower or "深圳" in response_lower:
-                            # 检测到错误引用
-                            from .hallucination import Hallucination
-                            analysis.hallucinations.append(Hallucination(
-                                type=HallucinationType.WRONG_REFERENCE,
-                                turn_id=turn_id,
-                                description=f"LLM错误地声称用户来自其他城市，但实际记忆是{mem.content}",
-                                evidence=llm_response,
-                                severity=0.9,
-                                suggested_correction=f"应该回答: {mem.content}"
-                            ))
+        # 找出回复中对各事实槽位的陈述，按槽位直接查事实表比较
+        contradictions = find_contradictions(llm_response, self.memory_state.facts)
+        for fact, claimed, snippet in contradictions:
+            mem = self.memory_state.get_memory_by_id(fact.memory_id)
+            analysis.hallucinations.append(Hallucination(
+                type=HallucinationType.WRONG_REFERENCE,
+                turn_id=turn_id,
+                description=f"LLM错误地声称「{snippet}」，但实际记忆是{mem.content}",
+                evidence=llm_response,
+                severity=0.9,
+                suggested_correction=f"应该回答: {mem.content}"
+            ))
         
         # 检测其他类型的幻觉
         hallucinations = self.hallucination_detector.detect(
@@ -286,20 +512,19 @@ class LLMMemoryAnalyzer:
             llm_response=llm_response,
             available_memories=available_memories,
             used_memories=analysis.used_memories,
-            missed_memories=analysis.missed_memories
+            missed_memories=analysis.missed_memories,
+            history_index=self.history_index
+        )
+        # 已判定为错误引用的陈述不再重复计为编造的记忆
+        snippets = [snippet for _, _, snippet in contradictions]
+        analysis.hallucinations.extend(
+            h for h in hallucinations
+            if not (h.type == HallucinationType.FABRICATED_MEMORY
+                    and any(snippet in h.evidence for snippet in snippets))
         )
-        analysis.hallucinations.extend(hallucinations)
         
         return analysis
     
     def _extract_keywords(self, text: str) -> List[str]:
-        """提取文本中的关键词"""
-        # 简单的关键词提取
-        keywords = []
-        # 提取中文（2-4字）
-        chinese_words = re.findall(r'[\u4e00-\u9fa5]{2,4}', text)
-        keywords.extend(chinese_words)
-        # 提取英文单词
-        english_words = re.findall(r'\b[a-zA-Z]{3,}\b', text)
-        keywords.extend([w.lower() for w in english_words])
-        return keywords
+        """提取文本中的关键词（分词 + 停用词过滤，结果按文本缓存）"""
+        return list(self.keyword_extractor.extract(text))
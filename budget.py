@@ -0,0 +1,94 @@
+"""分析预算模块
+
+为单个对话的分析设置墙钟时间、LLM调用次数、prompt token数和轮次数上限。
+预算耗尽时分析器不会中断，而是降级为截断历史或启发式分析，并在 ``MemoryState`` 中记录降级原因。
+"""
+
+import re
+import time
+from dataclasses import dataclass
+from typing import Callable, Optional, Tuple
+
+
+_CJK_RE = re.compile(r'[\u3000-\u303f\u4e00-\u9fff\uff00-\uffef]')
+
+
+def char_counts(text: str) -> Tuple[int, int]:
+    """返回 (中日韩字符数, 其余字符数)，两段文本拼接后的计数等于各自计数之和"""
+    cjk = len(_CJK_RE.findall(text))
+    return cjk, len(text) - cjk
+
+
+def tokens_from_counts(cjk: int, other: int) -> int:
+    """由字符计数估计token数，与estimate_tokens一致"""
+    return cjk + (other + 3) // 4
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    粗略估计文本的token数（不依赖分词器）
+
+    中日韩字符及全角标点按每字1个token计，其余字符按每4个字符1个token计。
+    """
+    return tokens_from_counts(*char_counts(text))
+
+
+@dataclass
+class AnalysisBudget:
+    """单个对话的分析预算，None表示不限制"""
+    deadline_seconds: Optional[float] = None  # 墙钟时间上限
+    max_llm_calls: Optional[int] = None  # LLM调用次数上限
+    max_prompt_tokens: Optional[int] = None  # prompt token总数上限
+    max_turns: Optional[int] = None  # 使用LLM分析的轮次数上限
+
+
+class BudgetTracker:
+    """跟踪单个对话的预算消耗"""
+
+    def __init__(self, budget: AnalysisBudget, clock: Callable[[], float] = time.monotonic):
+        self.budget = budget
+        self.clock = clock
+        self.started_at = clock()
+        self.llm_calls = 0
+        self.prompt_tokens = 0
+        self.turns = 0
+
+    def start_turn(self) -> None:
+        """开始分析新的一轮"""
+        self.turns += 1
+
+    def exhausted(self) -> Optional[str]:
+        """
+        检查是否已有预算耗尽
+
+        Returns:
+            耗尽的预算名称（"deadline"/"max_llm_calls"/"max_turns"），未耗尽返回None
+        """
+        budget = self.budget
+        if budget.deadline_seconds is not None and self.elapsed() >= budget.deadline_seconds:
+            return "deadline"
+        if budget.max_llm_calls is not None and self.llm_calls >= budget.max_llm_calls:
+            return "max_llm_calls"
+        if budget.max_turns is not None and self.turns > budget.max_turns:
+            return "max_turns"
+        return None
+
+    def remaining_tokens(self) -> Optional[int]:
+        """剩余的prompt token预算，None表示不限制"""
+        if self.budget.max_prompt_tokens is None:
+            return None
+        return max(self.budget.max_prompt_tokens - self.prompt_tokens, 0)
+
+    def remaining_seconds(self) -> Optional[float]:
+        """距墙钟时间上限的剩余秒数，None表示不限制"""
+        if self.budget.deadline_seconds is None:
+            return None
+        return max(self.budget.deadline_seconds - self.elapsed(), 0.0)
+
+    def charge(self, prompt_tokens: int) -> None:
+        """记录一次LLM调用的消耗"""
+        self.llm_calls += 1
+        self.prompt_tokens += prompt_tokens
+
+    def elapsed(self) -> float:
+        return self.clock() - self.started_at
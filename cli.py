@@ -6,7 +6,15 @@ import os
 import sys
 from pathlib import Path
 from .analyzer import LLMMemoryAnalyzer
-from .report import ReportGenerator
+from .aggregate import aggregate_corpus, iter_dialogue_files
+from .prompt import PromptBuilder
+from .segment import SEGMENTERS, MaxMatchSegmenter
+from .report import ReportGenerator, CorpusReportGenerator
+from .html_report import HTMLReportGenerator
+from .planner import PlanConfig, format_plan, plan_corpus
+from .budget import AnalysisBudget
+from .local_client import LocalLLMClient
+from .sampling import TurnSampler, reservoir_sample_turns
 
 
 def load_dialogue(filepath: str) -> dict:
@@ -32,19 +40,38 @@ def main():
 示例:
   %(prog)s examples/dialogue.json
   %(prog)s examples/dialogue.json --output report.md
+  %(prog)s examples/dialogue.json --format html --output report_html
   %(prog)s examples/dialogue.json --llm-api openai --api-key YOUR_KEY
+  %(prog)s examples/dialogue.json --llm-api local --base-url http://127.0.0.1:8080
+  %(prog)s dialogues/*.json --workers 4 --corpus-report corpus_report.md
+  %(prog)s dialogues/*.json --plan --workers 8 --latency 2.5
         """
     )
     
     parser.add_argument(
-        "dialogue_file",
-        help="对话JSON文件路径"
+        "dialogue_files",
+        nargs="+",
+        metavar="dialogue_file",
+        help="对话JSON文件路径，传入多个文件时生成语料汇总报告"
     )
     
     parser.add_argument(
         "-o", "--output",
-        default="memory_report.md",
-        help="输出报告文件路径 (默认: memory_report.md)"
+        help="输出报告路径，html格式为目录 (默认: memory_report.md 或 memory_report_html)"
+    )
+    
+    parser.add_argument(
+        "--format",
+        choices=["markdown", "html"],
+        default="markdown",
+        help="单对话报告格式: html=分页报告目录，适合超长对话 (默认: markdown)"
+    )
+    
+    parser.add_argument(
+        "--page-size",
+        type=int,
+        default=200,
+        help="html报告每页的轮次数 (默认: 200)"
     )
     
     parser.add_argument(
@@ -64,32 +91,212 @@ def main():
         help="使用的模型名称 (默认: gpt-4)"
     )
     
+    parser.add_argument(
+        "--base-url",
+        default="http://127.0.0.1:8080",
+        help="本地模型服务地址（OpenAI兼容接口），仅用于local (默认: http://127.0.0.1:8080)"
+    )
+    
+    parser.add_argument(
+        "--timeout",
+        type=float,
+        default=60.0,
+        help="本地模型服务的单次请求超时（秒） (默认: 60)"
+    )
+    
+    parser.add_argument(
+        "--sample-rate",
+        type=float,
+        help="抽样分析的轮次比例 (0-1]，未抽中的轮次只做启发式记忆提取 (默认: 分析全部轮次)"
+    )
+    
+    parser.add_argument(
+        "--sample-size",
+        type=int,
+        help="蓄水池抽样：在所有对话的轮次中单遍均匀抽取K轮做完整分析，与--sample-rate互斥"
+    )
+    
+    parser.add_argument(
+        "--sample-strategy",
+        choices=list(TurnSampler.STRATEGIES),
+        default="uniform",
+        help="抽样策略: uniform=均匀, position=按轮次位置分层, length=按对话长度分层 (默认: uniform)"
+    )
+    
+    parser.add_argument(
+        "--seed",
+        type=int,
+        help="抽样随机种子"
+    )
+    
+    parser.add_argument(
+        "--prompt-layout",
+        choices=list(PromptBuilder.LAYOUTS),
+        default="default",
+        help="分析Prompt布局: prefix_stable=同一对话各轮共享固定前缀，便于Prompt缓存 (默认: default)"
+    )
+    
+    parser.add_argument(
+        "--history-window",
+        type=int,
+        help="分析Prompt只保留最近N轮历史（默认保留全部历史）；"
+             "prefix_stable布局下以N/2轮为步长整块滑动，保持缓存前缀"
+    )
+    
+    parser.add_argument(
+        "--segmenter",
+        choices=list(SEGMENTERS),
+        default="dict",
+        help="关键词提取的分词方式: dict=内置词典最大匹配, ngram=二元片段 (默认: dict)"
+    )
+    
+    parser.add_argument(
+        "--user-dict",
+        help="自定义词典文件（每行一个词），与内置词典合并，仅用于dict分词"
+    )
+    
+    parser.add_argument(
+        "--deadline",
+        type=float,
+        help="每个对话的分析时间上限（秒），超时后剩余轮次使用启发式分析"
+    )
+    
+    parser.add_argument(
+        "--max-llm-calls",
+        type=int,
+        help="每个对话的LLM调用次数上限"
+    )
+    
+    parser.add_argument(
+        "--max-prompt-tokens",
+        type=int,
+        help="每个对话的prompt token总数上限（估算值），不足时先截断历史再降级为启发式分析"
+    )
+    
+    parser.add_argument(
+        "--max-turns",
+        type=int,
+        help="每个对话使用LLM分析的轮次数上限"
+    )
+    
+    parser.add_argument(
+        "--corpus-report",
+        default="corpus_report.md",
+        help="多文件模式下的语料汇总报告路径 (默认: corpus_report.md)"
+    )
+    
+    parser.add_argument(
+        "--plan",
+        action="store_true",
+        help="只估算调用次数、token数和墙钟时间，不调用LLM也不生成报告"
+    )
+    
+    parser.add_argument(
+        "--latency",
+        type=float,
+        default=3.0,
+        help="--plan 估算时单次LLM调用的平均延迟（秒），并发数取 --workers (默认: 3.0)"
+    )
+    
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=1,
+        help="多文件模式下的并行数：模拟分析使用多进程，LLM分析或抽样/预算模式使用多线程 (默认: 1)"
+    )
+    
     args = parser.parse_args()
     
-    # 加载对话数据
-    print(f"📖 加载对话文件: {args.dialogue_file}")
-    dialogue_data = load_dialogue(args.dialogue_file)
+    if args.page_size < 1:
+        print(f"错误: 每页条目数必须为正整数: {args.page_size}", file=sys.stderr)
+        sys.exit(1)
+    
+    if args.history_window is not None and args.history_window < 1:
+        print(f"错误: 历史窗口必须为正整数: {args.history_window}", file=sys.stderr)
+        sys.exit(1)
     
     # 初始化LLM客户端（如果需要）
     llm_client = None
-    if args.llm_api:
-        llm_client = create_llm_client(args.llm_api, args.api_key, args.model)
+    if args.llm_api and not args.plan:
+        llm_client = create_llm_client(args.llm_api, args.api_key, args.model,
+                                       base_url=args.base_url, timeout=args.timeout,
+                                       pool_size=max(1, args.workers))
         if not llm_client:
             print("⚠️  警告: LLM客户端初始化失败，使用模拟分析", file=sys.stderr)
     
+    if args.sample_size is not None and (args.sample_rate is not None or args.sample_size < 1):
+        print("错误: --sample-size 必须为正整数，且不能与 --sample-rate 同时使用", file=sys.stderr)
+        sys.exit(1)
+    
+    sampler = None
+    if args.sample_rate is not None:
+        try:
+            sampler = TurnSampler(rate=args.sample_rate, strategy=args.sample_strategy,
+                                  seed=args.seed)
+        except ValueError as e:
+            print(f"错误: {e}", file=sys.stderr)
+            sys.exit(1)
+    
+    budget = None
+    if any(v is not None for v in (args.deadline, args.max_llm_calls,
+                                   args.max_prompt_tokens, args.max_turns)):
+        budget = AnalysisBudget(
+            deadline_seconds=args.deadline,
+            max_llm_calls=args.max_llm_calls,
+            max_prompt_tokens=args.max_prompt_tokens,
+            max_turns=args.max_turns
+        )
+    
+    if args.user_dict and args.segmenter != "dict":
+        print(f"错误: --user-dict 只能与 --segmenter dict 一起使用（当前为 {args.segmenter}）", file=sys.stderr)
+        sys.exit(1)
+    
+    segmenter = None
+    if args.user_dict:
+        try:
+            with open(args.user_dict, 'r', encoding='utf-8') as f:
+                segmenter = MaxMatchSegmenter(words=f.read().split())
+        except FileNotFoundError:
+            print(f"错误: 文件不存在: {args.user_dict}", file=sys.stderr)
+            sys.exit(1)
+    elif args.segmenter != "dict":
+        segmenter = SEGMENTERS[args.segmenter]()
+    
+    if args.plan:
+        run_plan(args, sampler)
+        return
+    
+    if len(args.dialogue_files) > 1:
+        run_corpus(args, llm_client, sampler, budget, segmenter)
+        return
+    
+    # 加载对话数据
+    dialogue_file = args.dialogue_files[0]
+    print(f"📖 加载对话文件: {dialogue_file}")
+    dialogue_data = load_dialogue(dialogue_file)
+    
     # 创建分析器
     print("🔍 开始分析对话...")
-    analyzer = LLMMemoryAnalyzer(llm_client=llm_client)
+    analyzer = LLMMemoryAnalyzer(llm_client=llm_client, sampler=sampler, budget=budget,
+                                 prompt_layout=args.prompt_layout, segmenter=segmenter,
+                                 history_window=args.history_window)
     
     # 执行分析
-    memory_state = analyzer.analyze_dialogue(dialogue_data)
+    selected_turns = None
+    if args.sample_size is not None:
+        selected_turns = reservoir_sample_turns([dialogue_data], args.sample_size, seed=args.seed).get(0, set())
+    memory_state = analyzer.analyze_dialogue(dialogue_data, selected_turns=selected_turns)
     
     # 生成报告
     print("📝 生成报告...")
-    report_generator = ReportGenerator(memory_state)
-    report_generator.save_report(args.output)
-    
-    print(f"✅ 分析完成！报告已保存到: {args.output}")
+    if args.format == "html":
+        output = args.output or "memory_report_html"
+        index_path = HTMLReportGenerator(memory_state, page_size=args.page_size).save_report(output)
+        print(f"✅ 分析完成！报告已保存到: {index_path}")
+    else:
+        output = args.output or "memory_report.md"
+        ReportGenerator(memory_state).save_report(output)
+        print(f"✅ 分析完成！报告已保存到: {output}")
     
     # 打印简要统计
     total_turns = len(memory_state.turns)
@@ -100,9 +307,80 @@ def main():
     print(f"  - 总轮次数: {total_turns}")
     print(f"  - 总记忆项: {total_memories}")
     print(f"  - 幻觉总数: {total_hallucinations}")
+    if memory_state.skipped_turns:
+        print(f"  - 抽样跳过轮次: {len(memory_state.skipped_turns)}")
+    if memory_state.degraded_turns:
+        print(f"  - 低保真分析轮次: {len(memory_state.degraded_turns)}")
+    if analyzer.prefix_meter.records:
+        print(f"  - 分析Prompt共享前缀比例: {analyzer.prefix_meter.overall_ratio('analysis'):.1%}")
+
+
+def run_plan(args, sampler):
+    """规划模式：流式构建Prompt并估算开销，不发送任何请求"""
+    for filepath in args.dialogue_files:
+        if not os.path.isfile(filepath):
+            print(f"错误: 文件不存在: {filepath}", file=sys.stderr)
+            sys.exit(1)
+    
+    config = PlanConfig(prompt_layout=args.prompt_layout, concurrency=max(1, args.workers),
+                        latency_seconds=args.latency, history_window=args.history_window)
+    selection = None
+    if args.sample_size is not None:
+        selection = reservoir_sample_turns(iter_dialogue_files(args.dialogue_files),
+                                           args.sample_size, seed=args.seed)
+    plan = plan_corpus(args.dialogue_files, config, sampler, selection)
+    print(format_plan(plan))
+
+
+def run_corpus(args, llm_client, sampler, budget, segmenter):
+    """多文件模式：流式分析语料并生成汇总报告"""
+    for filepath in args.dialogue_files:
+        if not os.path.isfile(filepath):
+            print(f"错误: 文件不存在: {filepath}", file=sys.stderr)
+            sys.exit(1)
+    
+    # 使用LLM客户端或自定义配置时由工厂创建分析器（多线程共享客户端的连接池和微批处理），
+    # 否则由多进程worker各自使用默认的模拟分析
+    analyzer_factory = None
+    if llm_client or sampler or budget or segmenter:
+        analyzer_factory = lambda: LLMMemoryAnalyzer(llm_client=llm_client, sampler=sampler,
+                                                     budget=budget, prompt_layout=args.prompt_layout,
+                                                     segmenter=segmenter,
+                                                     history_window=args.history_window)
+    
+    selection = None
+    if args.sample_size is not None:
+        # 第一遍流式扫描只读取轮次ID，选出全语料中均匀分布的K个轮次
+        print(f"🎲 蓄水池抽样: 从全部轮次中抽取 {args.sample_size} 轮")
+        selection = reservoir_sample_turns(iter_dialogue_files(args.dialogue_files),
+                                           args.sample_size, seed=args.seed)
+    
+    print(f"🔍 开始分析语料: {len(args.dialogue_files)} 个对话文件")
+    aggregate = aggregate_corpus(
+        args.dialogue_files,
+        workers=args.workers,
+        analyzer_factory=analyzer_factory,
+        selection=selection
+    )
+    
+    print("📝 生成语料汇总报告...")
+    CorpusReportGenerator(aggregate).save_report(args.corpus_report)
+    print(f"✅ 分析完成！语料汇总报告已保存到: {args.corpus_report}")
+    
+    print(f"\n📊 统计信息:")
+    print(f"  - 对话数: {aggregate.dialogues}")
+    print(f"  - 分析轮次数: {aggregate.turns}")
+    print(f"  - 幻觉总数: {sum(aggregate.hallucination_counts.values())}")
+    if aggregate.skipped_turns:
+        estimate = aggregate.hallucination_rate()
+        print(f"  - 抽样跳过轮次: {aggregate.skipped_turns}")
+        print(f"  - 幻觉轮次比例: {estimate.rate:.2%} "
+              f"(95% CI: {estimate.lower:.2%} - {estimate.upper:.2%})")
 
 
-def create_llm_client(api_type: str, api_key: str = None, model: str = "gpt-4"):
+def create_llm_client(api_type: str, api_key: str = None, model: str = "gpt-4",
+                      base_url: str = "http://127.0.0.1:8080", timeout: float = 60.0,
+                      pool_size: int = 4):
     """创建LLM客户端"""
     if api_type == "openai":
         try:
@@ -118,13 +396,28 @@ def create_llm_client(api_type: str, api_key: str = None, model: str = "gpt-4"):
                     openai.api_key = api_key
                     self.model = model
                 
-                def call(self, prompt):
+                # OpenAI对相同前缀自动缓存，无需显式标记缓存断点
+                def call(self, prompt, timeout=None):
                     response = openai.ChatCompletion.create(
                         model=self.model,
                         messages=[{"role": "user", "content": prompt}],
-                        temperature=0.3
+                        temperature=0.3,
+                        request_timeout=timeout
                     )
                     return response.choices[0].message.content
+                
+                def stream(self, prompt, timeout=None):
+                    response = openai.ChatCompletion.create(
+                        model=self.model,
+                        messages=[{"role": "user", "content": prompt}],
+                        temperature=0.3,
+                        stream=True,
+                        request_timeout=timeout
+                    )
+                    for chunk in response:
+                        content = chunk.choices[0].delta.get("content")
+                        if content:
+                            yield content
             
             return OpenAIClient(api_key, model)
         except ImportError:
@@ -145,13 +438,40 @@ def create_llm_client(api_type: str, api_key: str = None, model: str = "gpt-4"):
                     self.client = anthropic.Anthropic(api_key=api_key)
                     self.model = model
                 
-                def call(self, prompt):
+                def call(self, prompt, timeout=None):
                     message = self.client.messages.create(
                         model=self.model,
                         max_tokens=4096,
-                        messages=[{"role": "user", "content": prompt}]
+                        messages=[{"role": "user", "content": self._content(prompt)}],
+                        **self._timeout(timeout)
                     )
                     return message.content[0].text
+                
+                def stream(self, prompt, timeout=None):
+                    with self.client.messages.stream(
+                        model=self.model,
+                        max_tokens=4096,
+                        messages=[{"role": "user", "content": self._content(prompt)}],
+                        **self._timeout(timeout)
+                    ) as stream:
+                        for text in stream.text_stream:
+                            yield text
+                
+                @staticmethod
+                def _timeout(timeout):
+                    # 不传timeout时沿用客户端的默认超时
+                    return {} if timeout is None else {"timeout": timeout}
+                
+                @staticmethod
+                def _content(prompt):
+                    # 前缀稳定的Prompt在固定前缀末尾设置缓存断点
+                    cut = getattr(prompt, "cache_prefix_len", 0)
+                    if not cut:
+                        return prompt
+                    return [
+                        {"type": "text", "text": prompt[:cut], "cache_control": {"type": "ephemeral"}},
+                        {"type": "text", "text": prompt[cut:]}
+                    ]
             
             return AnthropicClient(api_key, model)
         except ImportError:
@@ -159,9 +479,12 @@ def create_llm_client(api_type: str, api_key: str = None, model: str = "gpt-4"):
             return None
     
     elif api_type == "local":
-        # 本地模型客户端示例（需要根据实际情况实现）
-        print("警告: 本地模型客户端需要自定义实现", file=sys.stderr)
-        return None
+        try:
+            return LocalLLMClient(base_url=base_url, model=model, api_key=api_key,
+                                  timeout=timeout, pool_size=pool_size)
+        except ValueError as e:
+            print(f"错误: {e}", file=sys.stderr)
+            return None
     
     return None
 
@@ -0,0 +1,85 @@
+"""记忆衰减分析模块
+
+按记忆类别和重要性分组，统计记忆在产生后第d轮被使用/遗漏的次数，
+得到"记忆保持率 = 使用 / (使用 + 遗漏)"随轮次距离变化的衰减曲线。
+曲线在分析每一轮时增量更新，开销为O(使用数 + 遗漏数)。
+"""
+
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+
+
+MAX_DISTANCE_BUCKET = 16  # 距离分桶上限，最后一桶包含所有 >= 2**15 的距离
+
+
+def distance_bucket(distance: int) -> int:
+    """
+    将轮次距离映射到对数分桶
+
+    桶0: 距离0（同一轮产生并使用）；桶b (b>=1): 距离在 [2**(b-1), 2**b) 内
+    """
+    return min(max(distance, 0).bit_length(), MAX_DISTANCE_BUCKET)
+
+
+def bucket_range(bucket: int) -> Tuple[int, Optional[int]]:
+    """返回分桶覆盖的距离区间 [lo, hi]，最后一桶 hi 为 None"""
+    if bucket == 0:
+        return 0, 0
+    lo = 1 << (bucket - 1)
+    if bucket == MAX_DISTANCE_BUCKET:
+        return lo, None
+    return lo, (1 << bucket) - 1
+
+
+def importance_bucket(importance: float) -> str:
+    """重要性分档，与报告中的 🔴/🟡/🟢 阈值一致"""
+    if importance > 0.8:
+        return "high"
+    if importance > 0.5:
+        return "medium"
+    return "low"
+
+
+@dataclass
+class DecayCurves:
+    """按分组统计的记忆衰减曲线，可合并"""
+    # {分组: {距离分桶: [使用次数, 遗漏次数]}}，分组形如 "category:fact"、"importance:high"
+    counts: Dict[str, Dict[int, List[int]]] = field(default_factory=dict)
+
+    def record(self, category: str, importance: float, distance: int, used: bool) -> None:
+        """记录一次记忆使用或遗漏"""
+        bucket = distance_bucket(distance)
+        slot = 0 if used else 1
+        for group in (f"category:{category}", f"importance:{importance_bucket(importance)}"):
+            cell = self.counts.setdefault(group, {}).setdefault(bucket, [0, 0])
+            cell[slot] += 1
+
+    def curve(self, group: str) -> List[Tuple[int, Optional[int], float, int]]:
+        """返回某分组的衰减曲线 [(距离下界, 距离上界, 保持率, 样本数)]"""
+        curve = []
+        for bucket, (used, missed) in sorted(self.counts.get(group, {}).items()):
+            lo, hi = bucket_range(bucket)
+            curve.append((lo, hi, used / (used + missed), used + missed))
+        return curve
+
+    def groups(self) -> List[str]:
+        """返回所有分组名，类别在前、重要性在后"""
+        return sorted(self.counts)
+
+    def merge(self, other: 'DecayCurves') -> None:
+        """合并另一组衰减曲线"""
+        for group, buckets in other.counts.items():
+            target = self.counts.setdefault(group, {})
+            for bucket, (used, missed) in buckets.items():
+                cell = target.setdefault(bucket, [0, 0])
+                cell[0] += used
+                cell[1] += missed
+
+    def to_dict(self) -> Dict:
+        return {group: {str(b): list(c) for b, c in buckets.items()}
+                for group, buckets in self.counts.items()}
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> 'DecayCurves':
+        return cls(counts={group: {int(b): list(c) for b, c in buckets.items()}
+                           for group, buckets in data.items()})
@@ -0,0 +1,249 @@
+"""事实槽位模块
+
+将提取出的事实记忆存为带类型的槽位（姓名、地点、年龄、职业、偏好等），
+``MemoryState`` 按槽位名维护最新值。检测错误引用时，只需扫描一遍回复找出
+其中对各槽位的陈述，再按槽位名直接查表比较，开销与回复中提到的槽位数成正比，
+与记忆总数无关。
+"""
+
+import re
+from dataclasses import dataclass, field
+from typing import Container, Dict, List, Optional, Tuple
+
+
+_HAN = r"[\u4e00-\u9fa5]+"
+
+# 常见地名：只有命中地名（或带行政区划后缀）时，"我在X"才被当作所在地
+PLACE_NAMES = (
+    "北京", "上海", "天津", "重庆", "广州", "深圳", "杭州", "南京", "苏州", "成都", "武汉", "西安",
+    "长沙", "郑州", "济南", "青岛", "大连", "沈阳", "哈尔滨", "长春", "厦门", "福州", "合肥", "南昌",
+    "昆明", "贵阳", "南宁", "海口", "兰州", "西宁", "银川", "拉萨", "乌鲁木齐", "呼和浩特", "石家庄",
+    "太原", "宁波", "无锡", "东莞", "佛山", "香港", "澳门", "台北", "新疆", "西藏", "内蒙古", "广东",
+    "广西", "江苏", "浙江", "山东", "河南", "河北", "湖南", "湖北", "四川", "云南", "贵州", "福建",
+    "安徽", "江西", "陕西", "山西", "甘肃", "青海", "海南", "辽宁", "吉林", "黑龙江", "宁夏", "台湾",
+    "美国", "英国", "日本", "韩国", "法国", "德国", "加拿大", "澳大利亚", "新加坡", "国外", "海外",
+)
+_PLACE = "(?:" + "|".join(PLACE_NAMES) + r"|[\u4e00-\u9fa5]{1,4}[省市县])"
+
+# 疑问词：提取出的"值"包含这些字时说明是提问而不是陈述
+_INTERROGATIVES = ("哪", "什么", "谁", "几", "吗", "多少", "怎么")
+
+# 按句切分；以"吗"或问号结尾的句子是提问，提问所在的分句不提取槽位值也不当作陈述，
+# 但"你来自上海，对吗？"这类附加问句前面的分句仍是陈述
+_SENTENCE_RE = re.compile(r"[^。！？!?\n]+[。！？!?]*")
+_QUESTION_ENDINGS = ("吗", "？", "?")
+
+# 值的边界：中文正则的值分组是贪婪的，会带上"的"、"吧"等后续文字，比较前在此截断
+_VALUE_BOUNDARY = re.compile(r"[的了吧呢啊呀嘛哦是在和对也都就还很，。！？,.!?\s]")
+
+
+@dataclass
+class SlotDefinition:
+    """槽位定义"""
+    name: str
+    label: str  # 记忆内容中的标签，记忆内容格式为 "标签: 值"
+    category: str  # 对应的记忆类别
+    importance: float
+    extract_patterns: List[str]  # 从用户输入中提取值的模式，第1个分组为值
+    claim_patterns: List[str]  # LLM回复中关于该槽位的陈述模式，第1个分组为值
+    exclusive: bool = True  # 单值槽位：陈述的值与记忆不一致即为矛盾
+    negation_patterns: List[str] = field(default_factory=list)  # 多值槽位：否定陈述的模式
+    # 低置信度的提取模式（如"我在..."、"我是..."），只在槽位尚无值时使用，不会覆盖已有的值
+    weak_patterns: List[str] = field(default_factory=list)
+
+
+SLOT_DEFINITIONS = [
+    SlotDefinition(
+        name="name",
+        label="用户姓名",
+        category="fact",
+        importance=0.9,
+        extract_patterns=[
+            rf"我叫({_HAN})",
+            rf"我的名字是({_HAN})",
+        ],
+        # 只接受后面紧跟标点或句末的2-3个字，排除"程序员"、"学生"这类身份词
+        weak_patterns=[
+            r"我是(?!一)([\u4e00-\u9fa5]{2,3})(?<![员师生家者长工人手迷])(?=[，。！？,.!?\s]|$)",
+        ],
+        claim_patterns=[
+            rf"你叫({_HAN})",
+            rf"你的名字是({_HAN})",
+            rf"你的名字叫({_HAN})",
+        ],
+    ),
+    SlotDefinition(
+        name="location",
+        label="用户来自",
+        category="fact",
+        importance=0.9,
+        extract_patterns=[
+            rf"我来自({_HAN})",
+            rf"我住在({_HAN})",
+            rf"我搬到了?({_HAN})",
+            rf"我是({_HAN})人",
+        ],
+        weak_patterns=[rf"我在({_PLACE})"],
+        claim_patterns=[
+            rf"你来自({_HAN})",
+            rf"你住在({_HAN})",
+            rf"你是({_HAN})人",
+        ],
+    ),
+    SlotDefinition(
+        name="age",
+        label="用户年龄",
+        category="fact",
+        importance=0.8,
+        extract_patterns=[r"我今年(\d+)岁", r"我(\d+)岁"],
+        claim_patterns=[r"你今年(\d+)岁", r"你(\d+)岁"],
+    ),
+    SlotDefinition(
+        name="occupation",
+        label="用户职业",
+        category="fact",
+        importance=0.8,
+        extract_patterns=[rf"我是一名({_HAN})", rf"我的工作是({_HAN})", rf"我的职业是({_HAN})"],
+        claim_patterns=[rf"你是一名({_HAN})", rf"你的工作是({_HAN})", rf"你的职业是({_HAN})"],
+    ),
+    SlotDefinition(
+        name="preference",
+        label="用户喜欢",
+        category="preference",
+        importance=0.7,
+        extract_patterns=[r"喜欢([^，。！？]+)"],
+        claim_patterns=[],
+        exclusive=False,
+        negation_patterns=[r"你不喜欢([^，。！？]+)", r"你讨厌([^，。！？]+)"],
+    ),
+]
+
+SLOTS_BY_NAME = {slot.name: slot for slot in SLOT_DEFINITIONS}
+SLOTS_BY_LABEL = {slot.label: slot for slot in SLOT_DEFINITIONS}
+
+
+@dataclass
+class FactSlot:
+    """事实表中某个槽位的当前值"""
+    slot: str
+    value: str
+    memory_id: int
+    turn_id: int
+
+
+def _compile_claims() -> Tuple[re.Pattern, Dict[str, str]]:
+    """把所有槽位的陈述模式合并为一个正则，分组名映射到槽位名"""
+    parts = []
+    group_slots = {}
+    for slot in SLOT_DEFINITIONS:
+        patterns = slot.claim_patterns + slot.negation_patterns
+        for i, pattern in enumerate(patterns):
+            group = f"{slot.name}_{i}"
+            group_slots[group] = slot.name
+            # 原模式中的值分组改为命名分组，其余分组保持不捕获
+            parts.append(pattern.replace("(", f"(?P<{group}>", 1))
+    return re.compile("|".join(parts)), group_slots
+
+
+_CLAIM_RE, _CLAIM_GROUPS = _compile_claims()
+
+
+def _is_question(value: str) -> bool:
+    return any(word in value for word in _INTERROGATIVES)
+
+
+def _statements(text: str) -> str:
+    """去掉文本中疑问句的提问分句，其余部分以句号连接"""
+    sentences = []
+    for match in _SENTENCE_RE.finditer(text):
+        sentence = match.group(0).strip()
+        if sentence.rstrip("。！!").endswith(_QUESTION_ENDINGS):
+            clauses = re.split(r"[，,]", sentence)
+            sentence = "，".join(clauses[:-1])
+        sentence = sentence.rstrip("。！？!?，,")
+        if sentence:
+            sentences.append(sentence)
+    return "。".join(sentences)
+
+
+def extract_slots(user_input: str, known: Container[str] = ()) -> List[Tuple[SlotDefinition, str]]:
+    """
+    从用户输入中提取槽位值，每个槽位只取第一个命中的模式
+
+    Args:
+        user_input: 用户输入
+        known: 已经有值的槽位名（如事实表），这些槽位不使用低置信度模式
+    """
+    found = []
+    user_input = _statements(user_input)
+    for slot in SLOT_DEFINITIONS:
+        patterns = slot.extract_patterns
+        if slot.weak_patterns and slot.name not in known:
+            patterns = patterns + slot.weak_patterns
+        for pattern in patterns:
+            match = re.search(pattern, user_input)
+            if match:
+                value = match.group(1).strip()
+                if value and not _is_question(value):
+                    found.append((slot, value))
+                break
+    return found
+
+
+def parse_slot(content: str) -> Optional[Tuple[str, str]]:
+    """解析 "标签: 值" 格式的记忆内容，返回 (槽位名, 值)"""
+    for sep in (":", "："):
+        label, found, value = content.partition(sep)
+        if found and label.strip() in SLOTS_BY_LABEL and value.strip():
+            return SLOTS_BY_LABEL[label.strip()].name, value.strip()
+    return None
+
+
+def _normalize_value(value: str) -> str:
+    """截掉值中第一个边界字符之后的部分（保留首字符），用于相等比较"""
+    match = _VALUE_BOUNDARY.search(value, 1)
+    return (value[:match.start()] if match else value).strip()
+
+
+def _values_agree(stored: str, claimed: str) -> bool:
+    return _normalize_value(stored) == _normalize_value(claimed)
+
+
+def _values_overlap(stored: str, claimed: str) -> bool:
+    # 多值槽位（如偏好）的否定陈述通常只复述一部分，按包含关系比较
+    return stored in claimed or claimed in stored
+
+
+def find_contradictions(llm_response: str,
+                        facts: Dict[str, FactSlot]) -> List[Tuple[FactSlot, str, str]]:
+    """
+    找出回复中与事实表矛盾的陈述
+
+    Args:
+        llm_response: LLM回复
+        facts: 事实表 {槽位名: 当前值}
+
+    Returns:
+        [(矛盾的槽位, 回复中陈述的值, 陈述片段)]
+    """
+    contradictions = []
+    if not facts:
+        return contradictions
+    for match in _CLAIM_RE.finditer(_statements(llm_response)):
+        group = match.lastgroup
+        slot_name = _CLAIM_GROUPS[group]
+        fact = facts.get(slot_name)
+        if fact is None:
+            continue
+        claimed = match.group(group).strip()
+        if not claimed or _is_question(claimed):
+            continue
+        slot = SLOTS_BY_NAME[slot_name]
+        if slot.exclusive:
+            conflict = not _values_agree(fact.value, claimed)
+        else:
+            # 多值槽位只有否定陈述才可能与记忆矛盾
+            conflict = _values_overlap(fact.value, claimed)
+        if conflict:
+            contradictions.append((fact, claimed, match.group(0)))
+    return contradictions
@@ -1,8 +1,10 @@
 """幻觉检测模块"""
 
+import re
 from dataclasses import dataclass
 from typing import List, Optional
 from enum import Enum
+from .history_index import HistoryIndex
 
 
 class HallucinationType(Enum):
@@ -23,6 +25,30 @@ class Hallucination:
     suggested_correction: Optional[str] = None
 
 
+# 回忆声明：(模式, 被回忆的说话人角色)，分组1为声明的内容
+_RECALL_CLAIMS = [
+    (re.compile(r"你(?:之前|刚才|曾经|以前|上次)?(?:说过|提到过|告诉过我|讲过)[，,]?([^，。！？,.!?]+)"), "user"),
+    (re.compile(r"我(?:之前|刚才|曾经|以前|上次)?(?:说过|提到过|告诉过你|讲过)[，,]?([^，。！？,.!?]+)"), "assistant"),
+]
+
+# "你提到过的那个项目很有意思"：回忆动词修饰后面的名词，被回忆的只是中心语（"项目"），
+# 中心语之后的评价谓语（"很有意思"）不属于声明
+_ATTRIBUTIVE_HEAD = re.compile(
+    r"^的(?:[那这][个些件位家本部种次款]?)?([^很挺真太好非特比是有都也还就会能可让令我你他她]+)"
+)
+
+# 片段至少包含这么多个n字片段时，覆盖率不足才判定为编造，过短的片段覆盖率不可靠
+_MIN_CLAIM_NGRAMS = 2
+
+# 声明内容中的人称、谓词和虚词，核实时只检查剩下的实体片段
+_CLAIM_FILLERS = re.compile(
+    r"我们|你们|我|你|的|了|过|是|叫|喜欢|来自|住在|在|说|提到|告诉|想|要|很|也|都|特别|非常|一个|名字"
+)
+
+# 声明内容包含这些词时是提问而不是陈述
+_QUESTION_WORDS = ("吗", "什么", "哪", "谁", "呢")
+
+
 class HallucinationDetector:
     """幻觉检测器"""
     
@@ -36,7 +62,8 @@ class HallucinationDetector:
     def detect(self, turn_id: int, llm_response: str, 
                available_memories: List[str],
                used_memories: List[int],
-               missed_memories: List[int]) -> List[Hallucination]:
+               missed_memories: List[int],
+               history_index: Optional[HistoryIndex] = None) -> List[Hallucination]:
         """
         检测幻觉
         
@@ -46,6 +73,7 @@ class HallucinationDetector:
             available_memories: 可用的历史记忆列表
             used_memories: 已使用的记忆ID列表
             missed_memories: 遗漏的记忆ID列表
+            history_index: 对话历史索引，提供时核实回复中的回忆声明以检测编造的记忆
         
         Returns:
             检测到的幻觉列表
@@ -63,4 +91,41 @@ class HallucinationDetector:
                     severity=0.7
                 ))
         
+        # 检测编造的记忆
+        if history_index is not None:
+            hallucinations.extend(self.detect_fabricated(turn_id, llm_response, history_index))
+        
+        return hallucinations
+    
+    def detect_fabricated(self, turn_id: int, llm_response: str,
+                          history_index: HistoryIndex) -> List[Hallucination]:
+        """
+        核实回复中"你之前说过..."之类的回忆声明
+        
+        只核实回忆动词的宾语：定语形式（"你提到过的那个项目很有意思"）只取中心语。
+        声明中足够长的实体片段在对应角色的历史里找不到（覆盖率不足一半）时判定为编造。
+        每个片段的查询开销与片段长度成正比，与历史长度无关。
+        """
+        hallucinations = []
+        min_length = history_index.n + _MIN_CLAIM_NGRAMS - 1
+        for pattern, role in _RECALL_CLAIMS:
+            for match in pattern.finditer(llm_response):
+                claim = match.group(1).strip()
+                if claim.startswith("的"):
+                    head = _ATTRIBUTIVE_HEAD.match(claim)
+                    claim = head.group(1) if head else ""
+                if not claim or any(word in claim for word in _QUESTION_WORDS):
+                    continue
+                fragments = [f for f in _CLAIM_FILLERS.sub(" ", claim).split() if len(f) >= min_length]
+                unsupported = [f for f in fragments
+                               if history_index.coverage(f, role=role) < 0.5]
+                if unsupported:
+                    speaker = "用户" if role == "user" else "模型"
+                    hallucinations.append(Hallucination(
+                        type=HallucinationType.FABRICATED_MEMORY,
+                        turn_id=turn_id,
+                        description=f"声称{speaker}之前说过「{claim}」，但历史中没有{'、'.join(unsupported)}",
+                        evidence=match.group(0),
+                        severity=0.8
+                    ))
         return hallucinations
@@ -0,0 +1,93 @@
+"""对话历史索引模块
+
+按角色增量索引对话历史中出现过的n字片段（n-gram），在与历史长度无关的时间内
+计算一段文本有多少字符能在历史中找到出处，用于在不调用LLM的情况下核实
+"你之前说过..."这类回忆声明，检测编造的记忆。
+
+内存有上界：片段较少时使用精确集合，超过阈值后转为固定大小的布隆过滤器。
+布隆过滤器只会把没出现过的片段误判为出现过，即只会少报、不会多报编造的记忆。
+"""
+
+from typing import Dict, Set
+
+
+class NGramSet:
+    """n-gram成员集合：条目较少时精确存储，超过exact_limit后转为固定大小的布隆过滤器"""
+
+    def __init__(self, exact_limit: int = 1 << 14, size_bits: int = 1 << 24):
+        """
+        Args:
+            exact_limit: 精确集合的最大条目数
+            size_bits: 布隆过滤器的位数（默认2MB），取2的幂
+        """
+        self.exact_limit = exact_limit
+        self.size_bits = size_bits
+        self._exact: Set[str] = set()
+        self._bits = None  # 转为布隆过滤器后的位图
+
+    def add(self, gram: str) -> None:
+        if self._bits is None:
+            self._exact.add(gram)
+            if len(self._exact) > self.exact_limit:
+                self._to_bloom()
+            return
+        for probe in self._probes(gram):
+            self._bits[probe >> 3] |= 1 << (probe & 7)
+
+    def __contains__(self, gram: str) -> bool:
+        if self._bits is None:
+            return gram in self._exact
+        return all(self._bits[probe >> 3] & (1 << (probe & 7)) for probe in self._probes(gram))
+
+    def _probes(self, gram: str):
+        # 两个探测位取自同一个64位哈希值的不同位段
+        h = hash(gram)
+        mask = self.size_bits - 1
+        return h & mask, (h >> 32) & mask
+
+    def _to_bloom(self):
+        self._bits = bytearray(self.size_bits >> 3)
+        exact, self._exact = self._exact, set()
+        for gram in exact:
+            self.add(gram)
+
+
+class HistoryIndex:
+    """按角色分别索引的对话历史"""
+
+    def __init__(self, n: int = 2):
+        """
+        Args:
+            n: 片段长度，覆盖率只统计落在长度不小于n的公共片段内的字符
+        """
+        self.n = n
+        self._grams: Dict[str, NGramSet] = {}
+
+    def add(self, role: str, text: str) -> None:
+        """追加一条消息；片段不跨越消息边界"""
+        grams = self._grams.setdefault(role, NGramSet())
+        n = self.n
+        for i in range(len(text) - n + 1):
+            grams.add(text[i:i + n])
+
+    def coverage(self, text: str, role: str = "user") -> float:
+        """
+        text中能被该角色历史里长度不小于n的片段覆盖的字符比例
+
+        某个字符被覆盖，当且仅当包含它的某个n字片段在历史中出现过。
+
+        Returns:
+            0.0-1.0，1.0表示每个字符都落在某个出现过的片段内
+        """
+        grams = self._grams.get(role)
+        if grams is None or not text:
+            return 0.0
+        n = self.n
+        covered_until = 0  # 已计入覆盖的前缀长度
+        covered = 0
+        for i in range(len(text) - n + 1):
+            if text[i:i + n] in grams:
+                start = max(i, covered_until)
+                covered += i + n - start
+                covered_until = i + n
+        return covered / len(text)
@@ -0,0 +1,315 @@
+"""HTML分页报告模块
+
+超长对话（数千轮）的单文件Markdown报告动辄数十MB，浏览器和编辑器都难以打开。
+HTML报告写入一个目录：
+- index.html：执行摘要、统计总结和各分页的目录
+- turns-0001.html ...：按轮次分页的时间线
+- hallucinations-0001.html ...、missed-0001.html ...：只包含有幻觉/有遗漏记忆的轮次
+- memories-0001.html ...：记忆项列表
+
+所有页面在一次遍历中流式写出，每轮只渲染一次，内存占用只与页数有关。
+"""
+
+import os
+from collections import Counter
+from dataclasses import dataclass
+from datetime import datetime
+from html import escape
+from typing import List, Optional
+
+from .memory_state import MemoryState, TurnAnalysis
+from .report import (HALLUCINATION_TYPE_EMOJI, decay_rows, format_rate,
+                     hallucination_type_name, rate_estimates)
+from .sampling import estimate_hallucination_rate
+
+_STYLE = """body{font-family:-apple-system,"PingFang SC","Microsoft YaHei",sans-serif;max-width:960px;margin:0 auto;padding:1em;line-height:1.6;color:#222}
+nav{margin:1em 0;padding:.5em 0;border-top:1px solid #ddd;border-bottom:1px solid #ddd}
+nav a{margin-right:1em}
+section.turn{border-bottom:1px solid #eee;padding:.5em 0}
+blockquote{margin:.3em 0;padding:.2em .8em;border-left:3px solid #ccc;background:#fafafa;white-space:pre-wrap}
+table{border-collapse:collapse}
+th,td{border:1px solid #ddd;padding:.2em .6em;text-align:left}
+code{background:#f3f3f3;padding:0 .2em}
+.degraded{color:#8a6d3b}"""
+
+
+@dataclass
+class PageInfo:
+    """一个分页的元数据，用于生成索引页"""
+    number: int
+    filename: str
+    items: int = 0
+    first_turn: Optional[int] = None
+    last_turn: Optional[int] = None
+    hallucinations: int = 0
+    missed: int = 0
+
+
+def _page_head(title: str) -> str:
+    return (f"<!DOCTYPE html>\n<html lang=\"zh-CN\">\n<head>\n<meta charset=\"utf-8\">\n"
+            f"<title>{escape(title)}</title>\n<style>\n{_STYLE}\n</style>\n</head>\n<body>\n")
+
+
+class _PagedWriter:
+    """
+    把渲染好的条目流式写入分页文件
+
+    页满后等到下一个条目到来时才换页，因此写页脚时已经知道是否存在下一页。
+    """
+
+    def __init__(self, directory: str, prefix: str, title: str, page_size: int):
+        self.directory = directory
+        self.prefix = prefix
+        self.title = title
+        self.page_size = page_size
+        self.pages: List[PageInfo] = []
+        self._file = None
+
+    def write(self, html_text: str, turn_id: Optional[int] = None,
+              hallucinations: int = 0, missed: int = 0):
+        if self._file is None or self.pages[-1].items >= self.page_size:
+            self._open_page()
+        page = self.pages[-1]
+        page.items += 1
+        if turn_id is not None:
+            if page.first_turn is None:
+                page.first_turn = turn_id
+            page.last_turn = turn_id
+        page.hallucinations += hallucinations
+        page.missed += missed
+        self._file.write(html_text)
+
+    def close(self):
+        if self._file is not None:
+            self._finish_page(has_next=False)
+
+    def _filename(self, number: int) -> str:
+        return f"{self.prefix}-{number:04d}.html"
+
+    def _open_page(self):
+        if self._file is not None:
+            self._finish_page(has_next=True)
+        number = len(self.pages) + 1
+        page = PageInfo(number=number, filename=self._filename(number))
+        self.pages.append(page)
+        self._file = open(os.path.join(self.directory, page.filename), 'w', encoding='utf-8')
+        self._file.write(_page_head(f"{self.title} - 第 {number} 页"))
+        self._file.write(f"<h1>{escape(self.title)} · 第 {number} 页</h1>\n")
+        self._file.write(self._nav(number, has_next=True, include_next=False))
+
+    def _finish_page(self, has_next: bool):
+        number = len(self.pages)
+        self._file.write(self._nav(number, has_next=has_next))
+        self._file.write("</body>\n</html>\n")
+        self._file.close()
+        self._file = None
+
+    def _nav(self, number: int, has_next: bool, include_next: bool = True) -> str:
+        # 页首写出时还不知道是否有下一页，只在页脚给出"下一页"链接
+        links = ['<a href="index.html">📋 索引</a>']
+        if number > 1:
+            links.append(f'<a href="{self._filename(number - 1)}">← 上一页</a>')
+        if include_next and has_next:
+            links.append(f'<a href="{self._filename(number + 1)}">下一页 →</a>')
+        return f"<nav>{''.join(links)}</nav>\n"
+
+
+class HTMLReportGenerator:
+    """HTML分页报告生成器"""
+
+    def __init__(self, memory_state: MemoryState, page_size: int = 200):
+        """
+        Args:
+            memory_state: 分析得到的记忆状态
+            page_size: 每页的轮次（或记忆项）数
+        """
+        if page_size < 1:
+            raise ValueError(f"每页条目数必须为正整数: {page_size}")
+        self.memory_state = memory_state
+        self.page_size = page_size
+
+    def save_report(self, directory: str) -> str:
+        """
+        将报告写入目录
+
+        Returns:
+            索引页路径
+        """
+        os.makedirs(directory, exist_ok=True)
+        state = self.memory_state
+
+        turn_pages = _PagedWriter(directory, "turns", "时间线分析", self.page_size)
+        hallucination_pages = _PagedWriter(directory, "hallucinations", "存在幻觉的轮次", self.page_size)
+        missed_pages = _PagedWriter(directory, "missed", "遗漏关键信息的轮次", self.page_size)
+        memory_usage = Counter()
+        hallucination_by_type = Counter()
+
+        # 单次遍历：每轮渲染一次，同时写入时间线和对应的筛选页
+        for turn in state.turns:
+            section = self._render_turn(turn)
+            turn_pages.write(section, turn.turn_id, len(turn.hallucinations), len(turn.missed_memories))
+            if turn.hallucinations:
+                hallucination_pages.write(section, turn.turn_id)
+            if turn.missed_memories:
+                missed_pages.write(section, turn.turn_id)
+            memory_usage.update(turn.used_memories)
+            hallucination_by_type.update(hall.type for hall in turn.hallucinations)
+
+        memory_pages = _PagedWriter(directory, "memories", "记忆项", self.page_size)
+        for mem_id, mem in enumerate(state.memories):
+            memory_pages.write(self._render_memory_overview(mem_id, mem), mem.turn_id)
+
+        writers = (turn_pages, hallucination_pages, missed_pages, memory_pages)
+        for writer in writers:
+            writer.close()
+
+        index_path = os.path.join(directory, "index.html")
+        with open(index_path, 'w', encoding='utf-8') as f:
+            f.write(self._render_index(writers, memory_usage, hallucination_by_type))
+        return index_path
+
+    # ---- 渲染 ----
+
+    def _render_turn(self, turn: TurnAnalysis) -> str:
+        state = self.memory_state
+        parts = [f'<section class="turn" id="turn-{turn.turn_id}">\n'
+                 f"<h2>轮次 {turn.turn_id}</h2>\n"
+                 f"<p><strong>👤 用户输入:</strong></p>\n<blockquote>{escape(turn.user_input)}</blockquote>\n"
+                 f"<p><strong>🤖 LLM回复:</strong></p>\n<blockquote>{escape(turn.llm_response)}</blockquote>\n"]
+
+        degradations = state.degraded_turns.get(turn.turn_id)
+        if degradations:
+            parts.append(f'<p class="degraded"><strong>⚙️ 低保真分析:</strong> '
+                         f"{escape('；'.join(degradations))}</p>\n")
+
+        if turn.used_memories:
+            parts.append("<h3>✅ 使用的历史信息</h3>\n<ul>\n")
+            for mem_id in turn.used_memories:
+                mem = state.get_memory_by_id(mem_id)
+                if mem:
+                    parts.append(f"<li><strong>记忆 #{mem_id}</strong> [{escape(mem.category)}]: "
+                                 f"{escape(mem.content)}")
+                    ref_text = turn.memory_references.get(mem_id, "")
+                    if ref_text:
+                        parts.append(f"<br>引用片段: <code>{escape(ref_text[:100])}</code>")
+                    parts.append("</li>\n")
+            parts.append("</ul>\n")
+        else:
+            parts.append("<h3>⚠️ 未使用任何历史信息</h3>\n")
+
+        if turn.missed_memories:
+            parts.append("<h3>❌ 遗漏的关键信息</h3>\n<ul>\n")
+            for mem_id in turn.missed_memories:
+                mem = state.get_memory_by_id(mem_id)
+                if mem:
+                    importance_emoji = "🔴" if mem.importance > 0.8 else "🟡"
+                    parts.append(f"<li>{importance_emoji} <strong>记忆 #{mem_id}</strong> "
+                                 f"[{escape(mem.category)}]: {escape(mem.content)}"
+                                 f"<br>重要性: {mem.importance:.2f}</li>\n")
+            parts.append("</ul>\n")
+
+        if turn.hallucinations:
+            parts.append("<h3>🚨 幻觉检测</h3>\n<ul>\n")
+            for hall in turn.hallucinations:
+                type_name = hallucination_type_name(hall.type)
+                parts.append(f"<li>{HALLUCINATION_TYPE_EMOJI.get(hall.type, '⚪')} <strong>{type_name}</strong>"
+                             f"<br>描述: {escape(hall.description)}"
+                             f"<br>证据: <code>{escape(hall.evidence)}</code>"
+                             f"<br>严重程度: {hall.severity:.2f}")
+                if hall.suggested_correction:
+                    parts.append(f"<br>建议修正: {escape(hall.suggested_correction)}")
+                parts.append("</li>\n")
+            parts.append("</ul>\n")
+
+        parts.append("</section>\n")
+        return "".join(parts)
+
+    @staticmethod
+    def _render_memory_overview(mem_id: int, mem) -> str:
+        importance_emoji = "🔴" if mem.importance > 0.8 else "🟡" if mem.importance > 0.5 else "🟢"
+        return (f"<p>{mem_id}. {importance_emoji} <strong>[{escape(mem.category)}]</strong> "
+                f"{escape(mem.content)} (重要性: {mem.importance:.2f}，轮次 {mem.turn_id})</p>\n")
+
+    def _render_index(self, writers, memory_usage: Counter, hallucination_by_type: Counter) -> str:
+        state = self.memory_state
+        turn_pages, hallucination_pages, missed_pages, memory_pages = writers
+        parts = [_page_head("LLM记忆分析报告"),
+                 "<h1>LLM记忆分析报告</h1>\n",
+                 f"<p><strong>生成时间</strong>: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}</p>\n",
+                 "<h2>📊 执行摘要</h2>\n<ul>\n",
+                 f"<li><strong>总轮次数</strong>: {len(state.turns)}</li>\n",
+                 f"<li><strong>总记忆项</strong>: {len(state.memories)}</li>\n",
+                 f"<li><strong>幻觉总数</strong>: {sum(hallucination_by_type.values())}</li>\n"]
+        if state.degraded_turns:
+            parts.append(f"<li><strong>低保真分析轮次</strong>: {len(state.degraded_turns)}</li>\n")
+        parts.append("</ul>\n")
+
+        if state.turn_strata:
+            parts.append(self._render_sampling_section())
+
+        # 筛选视图
+        parts.append("<h2>🔎 筛选</h2>\n<ul>\n")
+        for label, writer in (("存在幻觉的轮次", hallucination_pages),
+                              ("遗漏关键信息的轮次", missed_pages),
+                              ("记忆项", memory_pages)):
+            count = sum(page.items for page in writer.pages)
+            if writer.pages:
+                parts.append(f'<li><a href="{writer.pages[0].filename}">{label}</a>: '
+                             f"{count}（{len(writer.pages)} 页）</li>\n")
+            else:
+                parts.append(f"<li>{label}: 0</li>\n")
+        parts.append("</ul>\n")
+
+        # 时间线目录
+        if turn_pages.pages:
+            parts.append("<h2>⏱️ 时间线分析</h2>\n<table>\n"
+                         "<tr><th>页码</th><th>轮次</th><th>幻觉</th><th>遗漏</th></tr>\n")
+            for page in turn_pages.pages:
+                parts.append(f'<tr><td><a href="{page.filename}">第 {page.number} 页</a></td>'
+                             f"<td>{page.first_turn} - {page.last_turn}</td>"
+                             f"<td>{page.hallucinations}</td><td>{page.missed}</td></tr>\n")
+            parts.append("</table>\n")
+
+        parts.append("<h2>📈 统计总结</h2>\n")
+        if memory_usage:
+            parts.append("<h3>记忆使用频率</h3>\n<ul>\n")
+            for mem_id, count in memory_usage.most_common(10):
+                mem = state.get_memory_by_id(mem_id)
+                if mem:
+                    parts.append(f"<li>记忆 #{mem_id}: {count} 次 - {escape(mem.content[:50])}</li>\n")
+            parts.append("</ul>\n")
+
+        if hallucination_by_type:
+            parts.append("<h3>幻觉类型分布</h3>\n<ul>\n")
+            for hall_type, count in hallucination_by_type.most_common():
+                parts.append(f"<li>{hallucination_type_name(hall_type)}: {count} 次</li>\n")
+            parts.append("</ul>\n")
+
+        parts.append(self._render_decay_section())
+        parts.append("</body>\n</html>\n")
+        return "".join(parts)
+
+    def _render_sampling_section(self) -> str:
+        state = self.memory_state
+        overall, by_type = rate_estimates(lambda hall_type: estimate_hallucination_rate([state], hall_type))
+        parts = ["<h3>抽样估计</h3>\n<ul>\n",
+                 f"<li><strong>抽样分析轮次</strong>: {len(state.turns)} / {len(state.turn_strata)}</li>\n",
+                 f"<li><strong>启发式跳过轮次</strong>: {len(state.skipped_turns)}</li>\n",
+                 f"<li><strong>幻觉轮次比例</strong>: {format_rate(overall)}<ul>\n"]
+        for name, estimate in by_type:
+            parts.append(f"<li>{name}: {format_rate(estimate)}</li>\n")
+        parts.append("</ul></li>\n</ul>\n")
+        return "".join(parts)
+
+    def _render_decay_section(self) -> str:
+        rows = decay_rows(self.memory_state.decay)
+        if not rows:
+            return ""
+        parts = ["<h3>记忆保持率（按轮次距离）</h3>\n",
+                 "<p>保持率 = 使用次数 / (使用次数 + 遗漏次数)</p>\n",
+                 "<table>\n<tr><th>分组</th><th>轮次距离</th><th>保持率</th><th>样本数</th></tr>\n"]
+        for group, span, retention, samples in rows:
+            parts.append(f"<tr><td>{escape(group)}</td><td>{span}</td>"
+                         f"<td>{retention:.2%}</td><td>{samples}</td></tr>\n")
+        parts.append("</table>\n")
+        return "".join(parts)
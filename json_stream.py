@@ -0,0 +1,172 @@
+"""LLM输出的增量JSON解析模块
+
+LLM返回的JSON经常包裹在markdown代码块中、后面跟着解释文字，或者因为截断而不完整。
+本模块在流式输出上增量定位第一个能解析的顶层JSON对象（前面说明文字里的花括号会被跳过），
+对象闭合后即可停止生成；无法整体解析时，从已输出的文本中抢救出各数组字段里完整的条目。
+"""
+
+import json
+import re
+from typing import Dict, Iterable, List, Optional, Tuple
+
+
+_DECODER = json.JSONDecoder()
+_FENCED_OBJECT = re.compile(r"```(?:json)?\s*\{")
+
+
+class IncrementalJSONParser:
+    """增量定位第一个能解析的顶层JSON对象的边界"""
+
+    def __init__(self):
+        self.buffer: List[str] = []
+        self.start: Optional[int] = None  # 对象起始 '{' 在全部输出中的位置
+        self.end: Optional[int] = None  # 对象结束 '}' 之后的位置
+        self._offset = 0
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+
+    @property
+    def complete(self) -> bool:
+        """顶层对象是否已经闭合"""
+        return self.end is not None
+
+    def feed(self, chunk: str) -> bool:
+        """
+        输入一段输出文本
+
+        Returns:
+            顶层对象是否已经闭合，闭合后调用方可以停止生成
+        """
+        if self.complete:
+            return True
+        self.buffer.append(chunk)
+        text, base = chunk, self._offset
+        self._offset += len(chunk)
+        i = 0
+        while i < len(text):
+            ch = text[i]
+            i += 1
+            if self.start is None:
+                if ch == "{":
+                    self.start = base + i - 1
+                    self._depth = 1
+                continue
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif ch == "\\":
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+            elif ch == '"':
+                self._in_string = True
+            elif ch in "{[":
+                self._depth += 1
+            elif ch in "}]":
+                self._depth -= 1
+                if self._depth == 0:
+                    if self._decodes(self.start, base + i):
+                        self.end = base + i
+                        break
+                    # 闭合的片段不是JSON对象（如说明文字里的"{a}"），从其后的下一个 '{' 重新定位
+                    base = self.start + 1
+                    text = self.text[base:]
+                    self._reset()
+                    i = 0
+        return self.complete
+
+    def _reset(self):
+        self.start = None
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+
+    def _decodes(self, start: int, end: int) -> bool:
+        try:
+            return isinstance(json.loads(self.text[start:end]), dict)
+        except json.JSONDecodeError:
+            return False
+
+    @property
+    def text(self) -> str:
+        """全部已输入的文本"""
+        return "".join(self.buffer)
+
+    def object_text(self) -> str:
+        """顶层对象部分的文本（未闭合时为已输出的部分）"""
+        if self.start is None:
+            return ""
+        return self.text[self.start:self.end]
+
+
+def salvage_arrays(text: str, keys: Iterable[str]) -> Dict[str, list]:
+    """
+    从不完整或格式有误的JSON文本中抢救指定数组字段里完整的对象条目
+
+    Args:
+        text: JSON对象文本（可能被截断）
+        keys: 需要抢救的数组字段名，如 "used_memories"、"hallucinations"
+
+    Returns:
+        {字段名: 成功解析的条目列表}，未找到或没有任何可用内容的字段不包含在结果中
+    """
+    salvaged = {}
+    for key in keys:
+        match = re.search(r'"%s"\s*:\s*\[' % re.escape(key), text)
+        if not match:
+            continue
+        items = []
+        closed = False
+        pos = match.end()
+        while True:
+            while pos < len(text) and text[pos] in " \t\r\n,":
+                pos += 1
+            if pos >= len(text):
+                break
+            if text[pos] == "]":
+                closed = True
+                break
+            try:
+                item, pos = _DECODER.raw_decode(text, pos)
+            except json.JSONDecodeError:
+                break
+            if isinstance(item, dict):
+                items.append(item)
+        # 数组完整闭合（可能为空）或至少抢救到一个条目时才视为有效
+        if items or closed:
+            salvaged[key] = items
+    return salvaged
+
+
+def parse_json_response(text: str, keys: Iterable[str] = ()) -> Tuple[Optional[Dict], bool]:
+    """
+    解析LLM输出中的JSON对象，容忍代码块和前后的说明文字
+
+    Args:
+        text: LLM的完整输出
+        keys: 整体解析失败时需要抢救的数组字段名
+
+    Returns:
+        (解析结果, 是否完整解析)。整体解析失败时返回抢救出的字段，
+        什么也没抢救到时返回 (None, False)
+    """
+    parser = IncrementalJSONParser()
+    parser.feed(text)
+    body = parser.object_text()
+    if parser.complete:
+        return json.loads(body), True
+    # 未闭合的候选可能是说明文字里不配对的括号或引号，改为尝试其后第一个代码块中的对象
+    if parser.start is not None:
+        fenced = _FENCED_OBJECT.search(text, parser.start + 1)
+        if fenced:
+            try:
+                result, _ = _DECODER.raw_decode(text, fenced.end() - 1)
+                if isinstance(result, dict):
+                    return result, True
+            except json.JSONDecodeError:
+                pass
+    salvaged = salvage_arrays(body, keys)
+    if not salvaged:
+        return None, False
+    return salvaged, False
@@ -0,0 +1,211 @@
+"""本地模型客户端模块
+
+面向OpenAI兼容接口的本地推理服务（llama.cpp server、vLLM等）的客户端，只依赖标准库：
+- 长连接池：复用keep-alive的HTTP连接，避免每次调用重新建立连接
+- 可配置的连接/读取超时
+- 并发请求：多个线程共享客户端时各自占用一条连接发送chat请求，由服务端的连续批处理
+  （continuous batching）合并推理，chat模板和前缀缓存与单独调用时完全一致
+- 流式输出：支持 stream 方法，配合分析器的增量JSON解析提前停止生成
+"""
+
+import http.client
+import json
+import queue
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterator, List, Optional, Tuple
+from urllib.parse import urlsplit
+
+
+class LocalLLMError(Exception):
+    """本地模型服务返回错误或无法连接"""
+
+
+# 复用的长连接已被服务端关闭时出现的异常，换新连接重试一次即可
+_STALE_CONNECTION_ERRORS = (http.client.RemoteDisconnected, ConnectionResetError, BrokenPipeError,
+                            http.client.CannotSendRequest, http.client.BadStatusLine)
+
+
+class LocalLLMClient:
+    """OpenAI兼容本地推理服务的客户端，可在多个线程间共享"""
+
+    def __init__(self, base_url: str = "http://127.0.0.1:8080",
+                 model: str = "local",
+                 api_key: Optional[str] = None,
+                 timeout: float = 60.0,
+                 pool_size: int = 4,
+                 temperature: float = 0.3,
+                 max_tokens: int = 2048):
+        """
+        初始化客户端
+
+        Args:
+            base_url: 服务地址，如 http://127.0.0.1:8080
+            model: 模型名称
+            api_key: 可选的API密钥（作为Bearer token发送）
+            timeout: 单次请求的连接/读取超时（秒）
+            pool_size: 长连接池大小，也是 call_many 同时在途的请求数
+            temperature: 采样温度
+            max_tokens: 单次生成的最大token数
+        """
+        parts = urlsplit(base_url)
+        if parts.scheme not in ("http", "https") or not parts.hostname:
+            raise ValueError(f"无效的服务地址: {base_url}")
+        self._scheme = parts.scheme
+        self._host = parts.hostname
+        self._port = parts.port
+        self._base_path = parts.path.rstrip("/")
+        self.model = model
+        self.api_key = api_key
+        self.timeout = timeout
+        self.temperature = temperature
+        self.max_tokens = max_tokens
+
+        self._pool_size = max(1, pool_size)
+        self._pool: "queue.LifoQueue[http.client.HTTPConnection]" = queue.LifoQueue(maxsize=self._pool_size)
+        self._closed = False
+
+    # ---- 公共接口 ----
+
+    def call(self, prompt: str, timeout: Optional[float] = None) -> str:
+        """发送单个Prompt，返回生成的文本；timeout只收紧本次请求的超时"""
+        if self._closed:
+            raise LocalLLMError("客户端已关闭")
+        data = self._post("/v1/chat/completions", self._chat_body(prompt), timeout)
+        return _choice_text(data["choices"][0])
+
+    def call_many(self, prompts: List[str]) -> List[str]:
+        """
+        并发发送多个Prompt，按输入顺序返回生成的文本
+
+        最多 pool_size 个请求同时在途，由服务端的连续批处理合并推理。
+        """
+        if len(prompts) <= 1:
+            return [self.call(prompt) for prompt in prompts]
+        with ThreadPoolExecutor(max_workers=min(self._pool_size, len(prompts))) as executor:
+            return list(executor.map(self.call, prompts))
+
+    def stream(self, prompt: str, timeout: Optional[float] = None) -> Iterator[str]:
+        """
+        流式生成，逐段返回文本
+
+        读到 [DONE] 的连接放回连接池；提前关闭生成器时立即关闭连接，中断服务端生成，
+        不为复用连接而等待剩余输出。
+        """
+        if self._closed:
+            raise LocalLLMError("客户端已关闭")
+        body = self._chat_body(prompt)
+        body["stream"] = True
+        conn, response = self._open("/v1/chat/completions", body, timeout)
+        reusable = False
+        try:
+            if response.status != 200:
+                raise LocalLLMError(f"服务返回错误 {response.status}: {response.read()[:200]!r}")
+            while True:
+                line = response.readline()
+                if not line:
+                    break
+                line = line.strip()
+                if not line.startswith(b"data:"):
+                    continue
+                payload = line[5:].strip()
+                if payload == b"[DONE]":
+                    # 读完剩余的分块结束标记后连接可以复用
+                    response.read()
+                    reusable = True
+                    break
+                chunk = json.loads(payload)
+                text = chunk["choices"][0].get("delta", {}).get("content")
+                if text:
+                    yield text
+        finally:
+            self._release(conn, reusable=reusable and not response.will_close)
+
+    def close(self):
+        """关闭连接池中的所有连接，之后的调用以 LocalLLMError 结束"""
+        self._closed = True
+        while True:
+            try:
+                self._pool.get_nowait().close()
+            except queue.Empty:
+                break
+
+    # ---- 连接池与HTTP ----
+
+    def _chat_body(self, prompt: str) -> Dict:
+        return {
+            "model": self.model,
+            "messages": [{"role": "user", "content": prompt}],
+            "temperature": self.temperature,
+            "max_tokens": self.max_tokens,
+            # llama.cpp server: 复用与上次请求相同前缀的KV缓存
+            "cache_prompt": True
+        }
+
+    def _post(self, path: str, body: Dict, timeout: Optional[float] = None) -> Dict:
+        """发送JSON请求并读取完整响应"""
+        conn, response = self._open(path, body, timeout)
+        try:
+            payload = response.read()
+        except (OSError, http.client.HTTPException) as e:
+            self._release(conn, reusable=False)
+            raise LocalLLMError(f"读取本地模型服务响应失败: {e}") from e
+        self._release(conn, reusable=not response.will_close)
+        if response.status != 200:
+            raise LocalLLMError(f"服务返回错误 {response.status}: {payload[:200]!r}")
+        return json.loads(payload)
+
+    def _open(self, path: str, body: Dict,
+              timeout: Optional[float] = None) -> Tuple[http.client.HTTPConnection, http.client.HTTPResponse]:
+        """发送请求并取得响应头；复用的连接已被服务端关闭时换新连接重试一次"""
+        timeout = self.timeout if timeout is None else min(self.timeout, timeout)
+        for attempt in range(2):
+            conn = self._acquire(fresh=attempt > 0)
+            # 连接池中的连接可能带着上一次请求收紧的超时，每次请求重新设置
+            conn.timeout = timeout
+            if conn.sock is not None:
+                conn.sock.settimeout(timeout)
+            try:
+                return conn, self._send(conn, path, body)
+            except _STALE_CONNECTION_ERRORS as e:
+                self._release(conn, reusable=False)
+                if attempt == 0:
+                    continue
+                raise LocalLLMError(f"连接本地模型服务失败: {e}") from e
+            except OSError as e:
+                self._release(conn, reusable=False)
+                raise LocalLLMError(f"连接本地模型服务失败: {e}") from e
+        raise LocalLLMError("连接本地模型服务失败")
+
+    def _send(self, conn: http.client.HTTPConnection, path: str,
+              body: Dict) -> http.client.HTTPResponse:
+        headers = {"Content-Type": "application/json", "Connection": "keep-alive"}
+        if self.api_key:
+            headers["Authorization"] = f"Bearer {self.api_key}"
+        conn.request("POST", self._base_path + path,
+                     body=json.dumps(body, ensure_ascii=False).encode("utf-8"), headers=headers)
+        return conn.getresponse()
+
+    def _acquire(self, fresh: bool = False) -> http.client.HTTPConnection:
+        if not fresh:
+            try:
+                return self._pool.get_nowait()
+            except queue.Empty:
+                pass
+        cls = http.client.HTTPSConnection if self._scheme == "https" else http.client.HTTPConnection
+        return cls(self._host, self._port, timeout=self.timeout)
+
+    def _release(self, conn: http.client.HTTPConnection, reusable: bool):
+        if not reusable or self._closed:
+            conn.close()
+            return
+        try:
+            self._pool.put_nowait(conn)
+        except queue.Full:
+            conn.close()
+
+
+def _choice_text(choice: Dict) -> str:
+    """兼容chat（message.content）和completions（text）两种返回格式"""
+    if "message" in choice:
+        return choice["message"].get("content") or ""
+    return choice.get("text") or ""
@@ -3,6 +3,8 @@
 from dataclasses import dataclass, field
 from typing import List, Dict, Optional, Set
 from datetime import datetime
+from .decay import DecayCurves
+from .facts import FactSlot
 
 
 @dataclass
@@ -13,6 +15,8 @@ class MemoryItem:
     importance: float  # 0.0-1.0
     category: str  # "fact", "preference", "context", "instruction"
     referenced_by: Set[int] = field(default_factory=set)  # 被哪些轮次引用
+    slot: Optional[str] = None  # 事实槽位名（如 "name"、"location"），非槽位记忆为None
+    value: Optional[str] = None  # 槽位值
 
 
 @dataclass
@@ -41,18 +45,57 @@ class MemoryState:
     turns: List[TurnAnalysis] = field(default_factory=list)
     memories: List[MemoryItem] = field(default_factory=list)
     
-    def add_memory(self, turn_id: int, content: str, importance: float, category: str) -> int:
-        """添加新的记忆项，返回记忆ID"""
+    # 抽样模式：未做完整分析、仅启发式提取记忆的轮次
+    skipped_turns: List[int] = field(default_factory=list)
+    
+    # 抽样模式：每个轮次（含跳过的轮次）所属的分层标签
+    turn_strata: Dict[int, str] = field(default_factory=dict)
+    
+    # 预算受限时降级分析的轮次：{轮次ID: [降级说明]}
+    degraded_turns: Dict[int, List[str]] = field(default_factory=dict)
+    
+    # 事实表：{槽位名: 最新值}，同一槽位后出现的值覆盖先前的值
+    facts: Dict[str, FactSlot] = field(default_factory=dict)
+    
+    # 按类别/重要性分组的记忆衰减曲线，由record_turn增量维护
+    decay: DecayCurves = field(default_factory=DecayCurves)
+    
+    def add_memory(self, turn_id: int, content: str, importance: float, category: str,
+                   slot: Optional[str] = None, value: Optional[str] = None) -> int:
+        """添加新的记忆项，返回记忆ID；带槽位的记忆同时更新事实表"""
         memory_id = len(self.memories)
         memory = MemoryItem(
             turn_id=turn_id,
             content=content,
             importance=importance,
-            category=category
+            category=category,
+            slot=slot,
+            value=value
         )
         self.memories.append(memory)
+        if slot and value:
+            self.facts[slot] = FactSlot(slot=slot, value=value, memory_id=memory_id, turn_id=turn_id)
         return memory_id
     
+    def record_turn(self, analysis: 'TurnAnalysis'):
+        """
+        记录一轮分析结果，增量更新记忆引用和衰减统计
+        
+        只遍历该轮使用和遗漏的记忆，开销为O(使用数 + 遗漏数)
+        """
+        self.turns.append(analysis)
+        for mem_id in analysis.used_memories:
+            memory = self.get_memory_by_id(mem_id)
+            if memory:
+                distance = analysis.turn_id - memory.turn_id
+                memory.referenced_by.add(analysis.turn_id)
+                self.decay.record(memory.category, memory.importance, distance, used=True)
+        for mem_id in analysis.missed_memories:
+            memory = self.get_memory_by_id(mem_id)
+            if memory:
+                distance = analysis.turn_id - memory.turn_id
+                self.decay.record(memory.category, memory.importance, distance, used=False)
+    
     def get_memory_by_id(self, memory_id: int) -> Optional[MemoryItem]:
         """根据ID获取记忆项"""
         if 0 <= memory_id < len(self.memories):
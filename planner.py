@@ -0,0 +1,295 @@
+"""运行规划模块
+
+在真正调用LLM之前估算一次语料分析的开销：调用次数、输入/输出token数、
+给定并发数和单次调用延迟下的预计墙钟时间，以及历史窗口、前缀缓存、抽样
+等选项各自能节省多少。
+
+只构建不发送：记忆提取Prompt和分析Prompt的固定部分由PromptBuilder实际构建，
+历史部分按条目累计字符计数的前缀和，token估计与对完整Prompt调用estimate_tokens一致，
+但不需要为每轮拼接越来越长的历史文本。对话逐个流式读取，任何时候都不持有全部Prompt。
+"""
+
+import heapq
+import json
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from .budget import char_counts, tokens_from_counts
+from .prompt import PromptBuilder, history_window_turns
+from .sampling import iter_turn_ids
+
+
+_HISTORY_MARKER = "## 历史对话\n"
+
+
+@dataclass
+class PlanConfig:
+    """规划参数"""
+    prompt_layout: str = "default"
+    concurrency: int = 1  # 同时分析的对话数
+    latency_seconds: float = 3.0  # 单次LLM调用的平均延迟
+    extraction_output_tokens: int = 150  # 每次记忆提取调用的预计输出token数
+    analysis_output_tokens: int = 400  # 每次轮次分析调用的预计输出token数
+    history_window: Optional[int] = None  # 分析时使用的历史窗口（轮数），与分析器的 history_window 一致
+    history_windows: Tuple[int, ...] = (4, 8, 16, 32)  # 对比的历史窗口（轮数）
+    sample_rates: Tuple[float, ...] = (0.5, 0.2)  # 未启用抽样时对比的抽样比例
+
+
+@dataclass
+class CorpusPlan:
+    """语料分析的开销估计"""
+    config: PlanConfig
+    dialogues: int = 0
+    turns: int = 0
+    sampled_turns: int = 0
+    extraction_calls: int = 0
+    analysis_calls: int = 0
+    extraction_input_tokens: int = 0
+    analysis_input_tokens: int = 0
+    full_history_analysis_tokens: int = 0  # 保留全部历史时的分析输入token数
+    cacheable_tokens: int = 0  # 分析Prompt中与上一轮分析Prompt共享前缀的token数
+    window_analysis_tokens: Dict[int, int] = field(default_factory=dict)  # {窗口轮数: 分析输入token数}
+    longest_dialogue_seconds: float = 0.0
+    wall_seconds: float = 0.0
+
+    @property
+    def calls(self) -> int:
+        return self.extraction_calls + self.analysis_calls
+
+    @property
+    def input_tokens(self) -> int:
+        return self.extraction_input_tokens + self.analysis_input_tokens
+
+    @property
+    def output_tokens(self) -> int:
+        return (self.extraction_calls * self.config.extraction_output_tokens
+                + self.analysis_calls * self.config.analysis_output_tokens)
+
+
+class Planner:
+    """流式累计各对话的开销估计"""
+
+    def __init__(self, config: Optional[PlanConfig] = None, sampler=None):
+        """
+        Args:
+            config: 规划参数
+            sampler: 轮次抽样器（TurnSampler），与分析时使用同一个抽样器可得到一致的抽样结果
+        """
+        self.config = config or PlanConfig()
+        if self.config.prompt_layout not in PromptBuilder.LAYOUTS:
+            raise ValueError(f"未知的Prompt布局: {self.config.prompt_layout}")
+        self.sampler = sampler
+        self.plan = CorpusPlan(config=self.config)
+        self.plan.window_analysis_tokens = {k: 0 for k in self.config.history_windows}
+        self._workers = [0.0] * max(1, self.config.concurrency)  # 各worker的累计耗时（最小堆）
+        self._head = char_counts(self._build_analysis_prompt(1, "", "", []).split(_HISTORY_MARKER)[0]
+                                 + _HISTORY_MARKER)
+
+    def add_file(self, filepath: str, selected_turns: Optional[Set[int]] = None):
+        with open(filepath, 'r', encoding='utf-8') as f:
+            self.add_dialogue(json.load(f), selected_turns)
+
+    def add_dialogue(self, dialogue_data: Dict, selected_turns: Optional[Set[int]] = None):
+        """
+        按分析器的配对和抽样规则累计一个对话的开销
+
+        Args:
+            selected_turns: 需要完整分析的轮次ID集合（如蓄水池抽样的结果），为None时由sampler决定
+        """
+        plan = self.plan
+        config = self.config
+        stable = config.prompt_layout == "prefix_stable"
+        turns = dialogue_data.get("turns", [])
+
+        selected = selected_turns
+        if selected is None and self.sampler is not None:
+            selected, _ = self.sampler.select(list(iter_turn_ids(dialogue_data)))
+
+        # 历史条目字符计数的前缀和，窗口内的历史开销为两个前缀和之差
+        cjk_sums = [0]
+        other_sums = [0]
+        previous_entries = None  # 上一次分析调用时的历史条目数
+        previous_begin = 0  # 上一次分析调用时窗口内第一条历史的位置
+        calls = 0
+
+        for i in range(0, len(turns) - 1, 2):
+            user_turn, assistant_turn = turns[i], turns[i + 1]
+            if user_turn.get("role") != "user" or assistant_turn.get("role") != "assistant":
+                continue
+            turn_id = i // 2 + 1
+            user_input = user_turn.get("content", "")
+            llm_response = assistant_turn.get("content", "")
+            plan.turns += 1
+
+            if selected is None or turn_id in selected:
+                plan.sampled_turns += 1
+                extraction = PromptBuilder.build_memory_extraction_prompt(turn_id, user_input, llm_response)
+                plan.extraction_calls += 1
+                plan.extraction_input_tokens += tokens_from_counts(*char_counts(extraction))
+
+                template_cjk, template_other = char_counts(
+                    self._build_analysis_prompt(turn_id, user_input, llm_response, [])
+                )
+                full_entries = len(cjk_sums) - 1
+                entries = 2 * history_window_turns(full_entries // 2, config.history_window,
+                                                   config.prompt_layout)
+                begin = full_entries - entries
+                plan.analysis_calls += 1
+                plan.analysis_input_tokens += tokens_from_counts(
+                    *self._with_history(template_cjk, template_other, cjk_sums, other_sums, entries, stable)
+                )
+                plan.full_history_analysis_tokens += tokens_from_counts(
+                    *self._with_history(template_cjk, template_other, cjk_sums, other_sums, full_entries, stable)
+                )
+                for window in config.history_windows:
+                    # 窗口截断时编号位数略有变化，按完整历史的条目计数近似
+                    plan.window_analysis_tokens[window] += tokens_from_counts(*self._with_history(
+                        template_cjk, template_other, cjk_sums, other_sums,
+                        2 * history_window_turns(full_entries // 2, window, config.prompt_layout), stable
+                    ))
+                if previous_entries is not None:
+                    if begin != previous_begin:
+                        # 窗口滑动后历史的开头变了，只有固定头部仍是共享前缀
+                        plan.cacheable_tokens += tokens_from_counts(*self._head)
+                    else:
+                        # 历史只追加，上一次分析Prompt的固定头部和历史部分是本次Prompt的前缀
+                        plan.cacheable_tokens += tokens_from_counts(*self._with_history(
+                            self._head[0], self._head[1], cjk_sums, other_sums, previous_entries, stable,
+                            start=previous_begin
+                        ))
+                previous_entries = entries
+                previous_begin = begin
+                calls += 2
+
+            for role, content in (("user", user_input), ("assistant", llm_response)):
+                index = len(cjk_sums) - 1
+                if stable:
+                    line = f"[轮次 {turn_id}] {role}: {content}\n"
+                else:
+                    line = f"[轮次 {index + 1}] {role}: {content}"
+                cjk, other = char_counts(line)
+                cjk_sums.append(cjk_sums[-1] + cjk)
+                other_sums.append(other_sums[-1] + other)
+
+        plan.dialogues += 1
+        # 同一对话内的调用串行，对话之间按提交顺序分配给最先空闲的worker
+        seconds = calls * config.latency_seconds
+        plan.longest_dialogue_seconds = max(plan.longest_dialogue_seconds, seconds)
+        finish = heapq.heappop(self._workers) + seconds
+        heapq.heappush(self._workers, finish)
+        plan.wall_seconds = max(plan.wall_seconds, finish)
+
+    def _build_analysis_prompt(self, turn_id: int, user_input: str,
+                               llm_response: str, history: List[Dict]) -> str:
+        if self.config.prompt_layout == "prefix_stable":
+            return PromptBuilder.build_prefix_stable_analysis_prompt(turn_id, user_input, llm_response, history)
+        return PromptBuilder.build_analysis_prompt(turn_id, user_input, llm_response, history)
+
+    @staticmethod
+    def _with_history(cjk: int, other: int, cjk_sums: List[int], other_sums: List[int],
+                      entries: int, stable: bool, start: Optional[int] = None) -> Tuple[int, int]:
+        """
+        在固定部分的字符计数上加上历史部分
+
+        Args:
+            entries: 历史条目数；start为None时取最近的entries条，否则从start开始取
+        """
+        end = len(cjk_sums) - 1 if start is None else start + entries
+        begin = end - entries
+        cjk += cjk_sums[end] - cjk_sums[begin]
+        other += other_sums[end] - other_sums[begin]
+        if not stable and entries > 1:
+            other += entries - 1  # 默认布局用换行符连接各条历史
+        return cjk, other
+
+
+def plan_corpus(filepaths: Iterable[str], config: Optional[PlanConfig] = None,
+                sampler=None, selection: Optional[Dict[int, Set[int]]] = None) -> CorpusPlan:
+    """
+    逐个读取对话文件并估算整个语料的分析开销
+
+    Args:
+        selection: 语料级抽样结果 {文件序号: 轮次ID集合}，与 ``aggregate_corpus`` 相同
+    """
+    planner = Planner(config, sampler)
+    for index, filepath in enumerate(filepaths):
+        planner.add_file(filepath, None if selection is None else selection.get(index, set()))
+    return planner.plan
+
+
+def _format_seconds(seconds: float) -> str:
+    if seconds < 60:
+        return f"{seconds:.1f} 秒"
+    if seconds < 3600:
+        return f"{seconds / 60:.1f} 分钟"
+    return f"{seconds / 3600:.1f} 小时"
+
+
+def format_plan(plan: CorpusPlan) -> str:
+    """生成规划结果的文本摘要"""
+    config = plan.config
+    lines = []
+    lines.append("# 分析开销估计（未发送任何请求）")
+    lines.append("")
+    lines.append(f"- 对话数: {plan.dialogues}")
+    lines.append(f"- 轮次数: {plan.turns}（需要LLM分析: {plan.sampled_turns}）")
+    lines.append(f"- LLM调用次数: {plan.calls}（记忆提取 {plan.extraction_calls}，轮次分析 {plan.analysis_calls}）")
+    lines.append(f"- 输入token: {plan.input_tokens:,}（记忆提取 {plan.extraction_input_tokens:,}，"
+                 f"轮次分析 {plan.analysis_input_tokens:,}）")
+    lines.append(f"- 输出token（按每次调用 {config.extraction_output_tokens}/{config.analysis_output_tokens} 估计）: "
+                 f"{plan.output_tokens:,}")
+    lines.append(f"- 预计墙钟时间（并发 {config.concurrency}，每次调用 {config.latency_seconds:g} 秒）: "
+                 f"{_format_seconds(plan.wall_seconds)}（最长的单个对话 "
+                 f"{_format_seconds(plan.longest_dialogue_seconds)}）")
+    lines.append("")
+
+    lines.append("## 可选优化")
+    lines.append("")
+    lines.append("### 历史窗口（--history-window N，分析Prompt只保留最近N轮历史）")
+    lines.append("")
+    lines.append("| 窗口 | 分析输入token | 相对全部历史节省 |")
+    lines.append("|---|---|---|")
+    lines.append(f"| 全部历史{'（当前）' if config.history_window is None else ''} | "
+                 f"{plan.full_history_analysis_tokens:,} | - |")
+    windows = dict(plan.window_analysis_tokens)
+    if config.history_window is not None:
+        windows[config.history_window] = plan.analysis_input_tokens
+    for window, tokens in sorted(windows.items()):
+        current = "（当前）" if window == config.history_window else ""
+        lines.append(f"| {window} 轮{current} | {tokens:,} | "
+                     f"{_saving(plan.full_history_analysis_tokens, tokens)} |")
+    lines.append("")
+
+    lines.append("### 前缀缓存")
+    lines.append("")
+    lines.append(f"- 当前布局（{config.prompt_layout}）下可命中缓存的分析输入token: {plan.cacheable_tokens:,} "
+                 f"（{_ratio(plan.cacheable_tokens, plan.analysis_input_tokens)}）")
+    if config.prompt_layout == "default":
+        lines.append("- prefix_stable 布局把固定说明和输出格式移到历史之前，可命中缓存的前缀更长")
+    lines.append("")
+
+    if plan.sampled_turns == plan.turns and config.sample_rates:
+        lines.append("### 抽样（按比例估计）")
+        lines.append("")
+        lines.append("| 抽样比例 | 调用次数 | 输入token | 预计墙钟时间 |")
+        lines.append("|---|---|---|---|")
+        for rate in config.sample_rates:
+            lines.append(f"| {rate:.0%} | {round(plan.calls * rate):,} | {round(plan.input_tokens * rate):,} | "
+                         f"{_format_seconds(plan.wall_seconds * rate)} |")
+        lines.append("")
+
+    lines.append("### 并发（本地模型）")
+    lines.append("")
+    lines.append(f"- 同一对话内的调用串行，最多 {config.concurrency} 个请求同时在途（--workers），"
+                 "由服务端的连续批处理合并推理")
+    lines.append("- 上面的墙钟时间假设并发请求不拖慢单次调用；实际取决于服务端的并发吞吐")
+    lines.append("")
+    return "\n".join(lines)
+
+
+def _ratio(part: int, total: int) -> str:
+    return f"{part / total:.1%}" if total else "0.0%"
+
+
+def _saving(baseline: int, value: int) -> str:
+    return _ratio(baseline - value, baseline)
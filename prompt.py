@@ -1,34 +1,10 @@
 """Prompt设计模块"""
 
-from typing import List, Dict
+from typing import List, Dict, Optional
 
 
-class PromptBuilder:
-    """Prompt构建器"""
-    
-    @staticmethod
-    def build_analysis_prompt(turn_id: int, 
-                             user_input: str,
-                             llm_response: str,
-                             history: List[Dict[str, str]]) -> str:
-        """
-        构建分析Prompt
-        
-        Args:
-            turn_id: 当前轮次ID
-            user_input: 用户输入
-            llm_response: LLM回复
-            history: 历史对话列表，每个元素包含 {"role": "user/assistant", "content": "..."}
-        
-        Returns:
-            完整的分析Prompt
-        """
-        history_text = "\n".join([
-            f"[轮次 {i+1}] {item['role']}: {item['content']}"
-            for i, item in enumerate(history)
-        ])
-        
-        prompt = f"""你是一个LLM记忆分析专家。请分析以下对话中LLM的记忆使用情况。
+# 分析Prompt中与轮次无关的固定部分
+_ANALYSIS_INSTRUCTIONS = """你是一个LLM记忆分析专家。请分析以下对话中LLM的记忆使用情况。
 
 ## 分析规则
 1. **只能基于给定的历史对话判断**，不要假设任何未提供的信息
@@ -36,45 +12,39 @@ class PromptBuilder:
    - 明确使用的历史信息
    - 应该使用但遗漏的关键信息
    - 基于不存在上下文生成的内容（幻觉）
+3. 输出中的 memory_id 必须取自给出的记忆项编号（[记忆 N] 中的N）
+"""
 
-## 历史对话
-{history_text}
-
-## 当前轮次分析
-**轮次 {turn_id}**
-用户输入: {user_input}
-LLM回复: {llm_response}
-
-## 分析任务
+_ANALYSIS_TASK = """## 分析任务
 请以JSON格式输出分析结果：
 
-{{
+{
   "used_memories": [
-    {{
+    {
       "memory_id": 0,
       "content": "引用的历史信息片段",
       "reference_text": "LLM回复中引用该信息的文本片段",
       "relevance": 0.9
-    }}
+    }
   ],
   "missed_memories": [
-    {{
+    {
       "memory_id": 1,
       "content": "应该引用但遗漏的历史信息",
       "importance": 0.8,
       "reason": "为什么这个信息很重要"
-    }}
+    }
   ],
   "hallucinations": [
-    {{
+    {
       "type": "fabricated_memory|forgotten_context|wrong_reference",
       "description": "幻觉描述",
       "evidence": "LLM回复中的证据片段",
       "severity": 0.7,
       "suggested_correction": "建议的修正"
-    }}
+    }
   ]
-}}
+}
 
 ## 幻觉类型说明
 - **fabricated_memory**: LLM声称存在但实际不存在的历史信息
@@ -86,8 +56,186 @@ LLM回复: {llm_response}
 2. 遗漏的记忆确实是关键且相关的
 3. 幻觉判断有明确的证据支持
 """
+
+
+class CachedPrompt(str):
+    """
+    带缓存断点的Prompt
+    
+    前 ``cache_prefix_len`` 个字符（固定说明 + 只追加的历史）在同一对话的各轮之间保持
+    逐字节一致，支持Prompt缓存的客户端可以在此处设置缓存断点；
+    不关心缓存的客户端把它当作普通字符串使用即可。
+    """
+    
+    def __new__(cls, prefix: str, suffix: str):
+        prompt = super().__new__(cls, prefix + suffix)
+        prompt.cache_prefix_len = len(prefix)
+        return prompt
+
+
+class PrefixReuseMeter:
+    """统计相邻两次同类调用的Prompt共享前缀比例"""
+    
+    def __init__(self):
+        self._previous: Dict[str, str] = {}
+        self.records: List[Dict] = []  # [{"kind", "turn_id", "prompt_chars", "shared_chars", "ratio"}]
+    
+    def record(self, kind: str, turn_id: int, prompt: str) -> float:
+        """记录一次调用，返回其与上一次同类Prompt的共享前缀比例"""
+        shared = common_prefix_len(self._previous.get(kind, ""), prompt)
+        self._previous[kind] = prompt
+        ratio = shared / len(prompt) if prompt else 0.0
+        self.records.append({
+            "kind": kind,
+            "turn_id": turn_id,
+            "prompt_chars": len(prompt),
+            "shared_chars": shared,
+            "ratio": ratio
+        })
+        return ratio
+    
+    def reset(self):
+        """开始新的对话：不同对话之间不共享前缀"""
+        self._previous.clear()
+    
+    def overall_ratio(self, kind: Optional[str] = None) -> float:
+        """按字符数加权的整体共享前缀比例"""
+        records = [r for r in self.records if kind is None or r["kind"] == kind]
+        total = sum(r["prompt_chars"] for r in records)
+        return sum(r["shared_chars"] for r in records) / total if total else 0.0
+
+
+def format_memory_line(memory: Dict) -> str:
+    """记忆项在分析Prompt中的一行，编号即LLM输出中的memory_id"""
+    return f"[记忆 {memory['memory_id']}] {memory['content']}\n"
+
+
+def history_window_turns(history_turns: int, window: Optional[int], layout: str = "default") -> int:
+    """
+    历史窗口内保留的轮数
+
+    默认布局每轮只保留最近 window 轮。前缀稳定布局下逐轮滑动会让历史的开头每轮都变，
+    缓存前缀只剩固定头部，因此改为以半个窗口为步长整块丢弃最早的历史：
+    保留的轮数在 (window - 步长, window] 之间，同一块内的各轮共享历史前缀。
+    """
+    if window is None or history_turns <= window:
+        return history_turns
+    if layout != "prefix_stable":
+        return window
+    step = max(1, window // 2)
+    dropped = (history_turns - window + step - 1) // step * step
+    return history_turns - dropped
+
+
+def common_prefix_len(a: str, b: str) -> int:
+    """二分查找公共前缀长度，切片比较在C层完成"""
+    lo, hi = 0, min(len(a), len(b))
+    if a[:hi] == b[:hi]:
+        return hi
+    while lo < hi:
+        mid = (lo + hi + 1) // 2
+        if a[:mid] == b[:mid]:
+            lo = mid
+        else:
+            hi = mid - 1
+    return lo
+
+
+class PromptBuilder:
+    """Prompt构建器"""
+    
+    LAYOUTS = ("default", "prefix_stable")
+    
+    @staticmethod
+    def build_analysis_prompt(turn_id: int, 
+                             user_input: str,
+                             llm_response: str,
+                             history: List[Dict[str, str]],
+                             memories: Optional[List[Dict]] = None) -> str:
+        """
+        构建分析Prompt
+        
+        Args:
+            turn_id: 当前轮次ID
+            user_input: 用户输入
+            llm_response: LLM回复
+            history: 历史对话列表，每个元素包含 {"role": "user/assistant", "content": "..."}
+            memories: 可供引用的记忆项，每个元素包含 {"memory_id", "turn_id", "content"}
+        
+        Returns:
+            完整的分析Prompt
+        """
+        history_text = "\n".join([
+            f"[轮次 {i+1}] {item['role']}: {item['content']}"
+            for i, item in enumerate(history)
+        ])
+        memory_text = "".join(format_memory_line(mem) for mem in memories or []) or "（无）\n"
+        
+        prompt = f"""{_ANALYSIS_INSTRUCTIONS}
+## 历史对话
+{history_text}
+
+## 记忆项
+{memory_text}
+## 当前轮次分析
+**轮次 {turn_id}**
+用户输入: {user_input}
+LLM回复: {llm_response}
+
+{_ANALYSIS_TASK}"""
         return prompt
     
+    @staticmethod
+    def build_prefix_stable_analysis_prompt(turn_id: int,
+                                            user_input: str,
+                                            llm_response: str,
+                                            history: List[Dict[str, str]],
+                                            memories: Optional[List[Dict]] = None) -> CachedPrompt:
+        """
+        构建前缀稳定的分析Prompt
+        
+        固定说明和输出格式放在最前面，随后是只追加的历史对话（按真实轮次ID编号），
+        每轮变化的内容放在最后。同一对话中第t+1轮的Prompt以第t轮的前缀原样开头，
+        便于服务端的Prompt/KV缓存复用。记忆项紧跟在产生它的轮次之后，
+        当前轮次产生的记忆放在后缀中。
+        
+        Args:
+            turn_id: 当前轮次ID
+            user_input: 用户输入
+            llm_response: LLM回复
+            history: 历史对话列表，元素可带 "turn_id"，缺省按位置推算
+            memories: 可供引用的记忆项，每个元素包含 {"memory_id", "turn_id", "content"}
+        
+        Returns:
+            带缓存断点的Prompt
+        """
+        by_turn: Dict[int, List[Dict]] = {}
+        for mem in memories or []:
+            by_turn.setdefault(mem["turn_id"], []).append(mem)
+        lines = []
+        for i, item in enumerate(history):
+            history_turn = item.get('turn_id', i // 2 + 1)
+            lines.append(f"[轮次 {history_turn}] {item['role']}: {item['content']}\n")
+            if item["role"] == "assistant":
+                lines.extend(format_memory_line(mem) for mem in by_turn.get(history_turn, []))
+        history_text = "".join(lines)
+        current_text = "".join(format_memory_line(mem) for mem in by_turn.get(turn_id, []))
+        if current_text:
+            current_text = "本轮产生的记忆:\n" + current_text
+        prefix = f"""{_ANALYSIS_INSTRUCTIONS}
+{_ANALYSIS_TASK}
+## 历史对话
+{history_text}"""
+        suffix = f"""
+## 当前轮次分析
+**轮次 {turn_id}**
+用户输入: {user_input}
+LLM回复: {llm_response}
+{current_text}
+请基于以上历史对话分析当前轮次，按上述JSON格式输出结果。
+"""
+        return CachedPrompt(prefix, suffix)
+    
     @staticmethod
     def build_memory_extraction_prompt(turn_id: int,
                                       user_input: str,
@@ -130,3 +278,25 @@ LLM回复: {llm_response}
 只提取重要且可能在后续对话中使用的信息。
 """
         return prompt
+
+    
+    @staticmethod
+    def build_json_retry_prompt(prompt: str, bad_output: str) -> str:
+        """
+        构建JSON输出的定向重试Prompt
+        
+        Args:
+            prompt: 原始Prompt
+            bad_output: 上一次无法解析的输出
+        
+        Returns:
+            重试Prompt
+        """
+        return f"""{prompt}
+
+## 输出格式纠正
+你上一次的输出无法解析为JSON：
+{bad_output[:500]}
+
+请重新输出，只输出一个符合上述格式的JSON对象，不要使用代码块，也不要添加任何说明文字。
+"""
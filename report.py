@@ -1,9 +1,70 @@
 """报告生成模块"""
 
-from typing import List
+from collections import Counter
+from typing import Callable, List, Optional, Tuple, Union
 from datetime import datetime
+from .aggregate import CorpusAggregate, SEVERITY_BINS
+from .decay import DecayCurves
 from .memory_state import MemoryState, TurnAnalysis
 from .hallucination import HallucinationType
+from .sampling import RateEstimate, estimate_hallucination_rate
+
+
+# Markdown和HTML报告共用的展示内容
+
+HALLUCINATION_TYPE_NAMES = {
+    HallucinationType.FABRICATED_MEMORY: "编造的记忆",
+    HallucinationType.FORGOTTEN_CONTEXT: "遗忘的上下文",
+    HallucinationType.WRONG_REFERENCE: "错误的引用"
+}
+
+HALLUCINATION_TYPE_EMOJI = {
+    HallucinationType.FABRICATED_MEMORY: "🔴",
+    HallucinationType.FORGOTTEN_CONTEXT: "🟡",
+    HallucinationType.WRONG_REFERENCE: "🟠"
+}
+
+
+def hallucination_type_name(hall_type: Union[HallucinationType, str]) -> str:
+    """幻觉类型的中文名称，接受枚举或其取值（语料汇总中按取值计数）"""
+    try:
+        hall_type = HallucinationType(hall_type)
+    except ValueError:
+        return str(hall_type)
+    return HALLUCINATION_TYPE_NAMES.get(hall_type, hall_type.value)
+
+
+def format_distance_span(lo: int, hi: Optional[int]) -> str:
+    """轮次距离区间的显示文本"""
+    return f"{lo}" if lo == hi else f"{lo}+" if hi is None else f"{lo}-{hi}"
+
+
+def format_rate(estimate: RateEstimate) -> str:
+    """比例估计及其置信区间的显示文本"""
+    return (f"{estimate.rate:.2%} ({estimate.confidence:.0%} CI: "
+            f"{estimate.lower:.2%} - {estimate.upper:.2%})")
+
+
+def rate_estimates(estimate: Callable[[Optional[HallucinationType]], RateEstimate]
+                   ) -> Tuple[RateEstimate, List[Tuple[str, RateEstimate]]]:
+    """
+    抽样估计小节的内容
+
+    Args:
+        estimate: 按幻觉类型（None表示任意类型）返回比例估计的函数
+
+    Returns:
+        (总体估计, [(类型名称, 该类型的估计)])
+    """
+    return estimate(None), [(name, estimate(hall_type))
+                            for hall_type, name in HALLUCINATION_TYPE_NAMES.items()]
+
+
+def decay_rows(decay: DecayCurves) -> List[Tuple[str, str, float, int]]:
+    """按类别/重要性分组的记忆保持率 [(分组, 轮次距离, 保持率, 样本数)]"""
+    return [(group, format_distance_span(lo, hi), retention, samples)
+            for group in decay.groups()
+            for lo, hi, retention, samples in decay.curve(group)]
 
 
 class ReportGenerator:
@@ -34,8 +95,14 @@ class ReportGenerator:
         lines.append(f"- **总轮次数**: {total_turns}")
         lines.append(f"- **总记忆项**: {total_memories}")
         lines.append(f"- **幻觉总数**: {total_hallucinations}")
+        if self.memory_state.degraded_turns:
+            lines.append(f"- **低保真分析轮次**: {len(self.memory_state.degraded_turns)}")
         lines.append("")
         
+        # 抽样估计
+        if self.memory_state.turn_strata:
+            lines.extend(self._generate_sampling_section())
+        
         # 记忆概览
         if self.memory_state.memories:
             lines.append("### 记忆项概览")
@@ -66,6 +133,12 @@ class ReportGenerator:
             lines.append(f"> {turn.llm_response}")
             lines.append("")
             
+            # 预算降级
+            degradations = self.memory_state.degraded_turns.get(turn.turn_id)
+            if degradations:
+                lines.append(f"**⚙️ 低保真分析:** {'；'.join(degradations)}")
+                lines.append("")
+            
             # 使用的记忆
             if turn.used_memories:
                 lines.append("#### ✅ 使用的历史信息")
@@ -99,18 +172,8 @@ class ReportGenerator:
                 lines.append("#### 🚨 幻觉检测")
                 lines.append("")
                 for hall in turn.hallucinations:
-                    type_emoji = {
-                        HallucinationType.FABRICATED_MEMORY: "🔴",
-                        HallucinationType.FORGOTTEN_CONTEXT: "🟡",
-                        HallucinationType.WRONG_REFERENCE: "🟠"
-                    }.get(hall.type, "⚪")
-                    
-                    type_name = {
-                        HallucinationType.FABRICATED_MEMORY: "编造的记忆",
-                        HallucinationType.FORGOTTEN_CONTEXT: "遗忘的上下文",
-                        HallucinationType.WRONG_REFERENCE: "错误的引用"
-                    }.get(hall.type, str(hall.type.value))
-                    
+                    type_emoji = HALLUCINATION_TYPE_EMOJI.get(hall.type, "⚪")
+                    type_name = hallucination_type_name(hall.type)
                     lines.append(f"- {type_emoji} **{type_name}**")
                     lines.append(f"  - 描述: {hall.description}")
                     lines.append(f"  - 证据: `{hall.evidence}`")
@@ -127,16 +190,15 @@ class ReportGenerator:
         lines.append("")
         
         # 记忆使用统计
-        memory_usage = {}
+        memory_usage = Counter()
         for turn in self.memory_state.turns:
-            for mem_id in turn.used_memories:
-                memory_usage[mem_id] = memory_usage.get(mem_id, 0) + 1
+            memory_usage.update(turn.used_memories)
         
         if memory_usage:
             lines.append("### 记忆使用频率")
             lines.append("")
-            sorted_usage = sorted(memory_usage.items(), key=lambda x: x[1], reverse=True)
-            for mem_id, count in sorted_usage[:10]:  # 显示前10个
+            # most_common(n) 使用堆选择前n个，避免全量排序
+            for mem_id, count in memory_usage.most_common(10):  # 显示前10个
                 mem = self.memory_state.get_memory_by_id(mem_id)
                 if mem:
                     lines.append(f"- 记忆 #{mem_id}: {count} 次 - {mem.content[:50]}...")
@@ -152,15 +214,143 @@ class ReportGenerator:
         if hallucination_by_type:
             lines.append("### 幻觉类型分布")
             lines.append("")
-            type_names = {
-                "fabricated_memory": "编造的记忆",
-                "forgotten_context": "遗忘的上下文",
-                "wrong_reference": "错误的引用"
-            }
             for hall_type, count in hallucination_by_type.items():
-                lines.append(f"- {type_names.get(hall_type, hall_type)}: {count} 次")
+                lines.append(f"- {hallucination_type_name(hall_type)}: {count} 次")
             lines.append("")
         
+        lines.extend(decay_section(self.memory_state.decay))
+        
+        return "\n".join(lines)
+    
+    def _generate_sampling_section(self) -> List[str]:
+        """生成抽样估计小节"""
+        lines = []
+        population = len(self.memory_state.turn_strata)
+        sample_size = len(self.memory_state.turns)
+        lines.append("### 抽样估计")
+        lines.append("")
+        lines.append(f"- **抽样分析轮次**: {sample_size} / {population}")
+        lines.append(f"- **启发式跳过轮次**: {len(self.memory_state.skipped_turns)}")
+        
+        lines.extend(_rate_lines(lambda hall_type: estimate_hallucination_rate([self.memory_state], hall_type)))
+        lines.append("")
+        return lines
+    
+    def save_report(self, filepath: str):
+        """保存报告到文件"""
+        report = self.generate_markdown_report()
+        with open(filepath, 'w', encoding='utf-8') as f:
+            f.write(report)
+
+
+
+def _rate_lines(estimate: Callable[[Optional[HallucinationType]], RateEstimate]) -> List[str]:
+    """抽样估计的Markdown列表项"""
+    overall, by_type = rate_estimates(estimate)
+    lines = [f"- **幻觉轮次比例**: {format_rate(overall)}"]
+    for name, type_estimate in by_type:
+        lines.append(f"  - {name}: {format_rate(type_estimate)}")
+    return lines
+
+
+def decay_section(decay: DecayCurves) -> List[str]:
+    """生成按类别/重要性分组的记忆保持率表格"""
+    rows = decay_rows(decay)
+    if not rows:
+        return []
+    lines = []
+    lines.append("### 记忆保持率（按轮次距离）")
+    lines.append("")
+    lines.append("保持率 = 使用次数 / (使用次数 + 遗漏次数)")
+    lines.append("")
+    lines.append("| 分组 | 轮次距离 | 保持率 | 样本数 |")
+    lines.append("|---|---|---|---|")
+    for group, span, retention, samples in rows:
+        lines.append(f"| {group} | {span} | {retention:.2%} | {samples} |")
+    lines.append("")
+    return lines
+
+
+class CorpusReportGenerator:
+    """语料汇总报告生成器"""
+    
+    def __init__(self, aggregate: CorpusAggregate):
+        self.aggregate = aggregate
+    
+    def generate_markdown_report(self, top_k: int = 10) -> str:
+        """生成Markdown格式的语料汇总报告"""
+        agg = self.aggregate
+        lines = []
+        
+        lines.append("# LLM记忆分析语料汇总报告")
+        lines.append("")
+        lines.append(f"**生成时间**: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
+        lines.append("")
+        lines.append("---")
+        lines.append("")
+        
+        # 执行摘要
+        lines.append("## 📊 执行摘要")
+        lines.append("")
+        total_hallucinations = sum(agg.hallucination_counts.values())
+        lines.append(f"- **对话数**: {agg.dialogues}")
+        lines.append(f"- **分析轮次数**: {agg.turns}")
+        if agg.skipped_turns:
+            lines.append(f"- **抽样跳过轮次**: {agg.skipped_turns}")
+        lines.append(f"- **总记忆项**: {agg.memories}")
+        lines.append(f"- **幻觉总数**: {total_hallucinations}")
+        lines.append("")
+        
+        # 抽样估计
+        if agg.skipped_turns:
+            lines.append("### 抽样估计")
+            lines.append("")
+            lines.append(f"- **抽样分析轮次**: {agg.turns} / {agg.turns + agg.skipped_turns}")
+            lines.extend(_rate_lines(agg.hallucination_rate))
+            lines.append("")
+        
+        # 幻觉统计
+        if agg.hallucination_counts:
+            lines.append("### 幻觉类型分布")
+            lines.append("")
+            for hall_type, count in sorted(agg.hallucination_counts.items(),
+                                           key=lambda x: x[1], reverse=True):
+                lines.append(f"- {hallucination_type_name(hall_type)}: {count} 次")
+            lines.append("")
+            
+            lines.append("### 严重程度分布")
+            lines.append("")
+            lines.append("| 严重程度 | 次数 |")
+            lines.append("|---|---|")
+            for i, count in enumerate(agg.severity_histogram):
+                lines.append(f"| {i / SEVERITY_BINS:.1f} - {(i + 1) / SEVERITY_BINS:.1f} | {count} |")
+            lines.append("")
+        
+        # Top-K记忆
+        for title, sketch in (("最常使用的记忆", agg.most_used), ("最常遗漏的记忆", agg.most_missed)):
+            top = sketch.top(top_k)
+            if not top:
+                continue
+            lines.append(f"### {title}")
+            lines.append("")
+            for content, count, error in top:
+                suffix = f" (误差 ≤ {error})" if error else ""
+                lines.append(f"- {count} 次{suffix} - {content[:50]}")
+            lines.append("")
+        
+        # 记忆衰减曲线
+        curve = agg.decay_curve()
+        if curve:
+            lines.append("### 记忆衰减曲线")
+            lines.append("")
+            lines.append("| 轮次距离 | 使用概率 | 样本数 |")
+            lines.append("|---|---|---|")
+            for lo, hi, probability, exposed in curve:
+                lines.append(f"| {format_distance_span(lo, hi)} | {probability:.2%} | {exposed} |")
+            lines.append("")
+        
+        lines.extend(decay_section(agg.decay_groups))
+        
         return "\n".join(lines)
     
     def save_report(self, filepath: str):
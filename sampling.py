@@ -0,0 +1,319 @@
+"""统计抽样模块
+
+用于超大规模语料的趋势监控：只对抽样出的轮次调用完整分析（LLM判定），
+其余轮次仅做启发式记忆提取以保持 ``MemoryState`` 一致，
+并按抽样设计给出带置信区间的幻觉率估计。
+"""
+
+import math
+import random
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from .hallucination import HallucinationType
+from .memory_state import MemoryState
+
+
+# 常用置信水平对应的正态分位数
+_Z_SCORES = {0.8: 1.2816, 0.9: 1.6449, 0.95: 1.96, 0.98: 2.3263, 0.99: 2.5758}
+
+# 等概率抽样（uniform、蓄水池抽样、全量分析）的层标签，各对话的轮次入样概率相同，跨对话直接合并
+POOLED_STRATUM = "all"
+
+# 对话内分层单元的方差使用"加二减二"修正的比例，避免小单元 p=0/1 时方差为零
+_CELL_PSEUDO_COUNT = 2.0
+
+
+@dataclass
+class RateEstimate:
+    """比例估计结果"""
+    rate: float
+    lower: float
+    upper: float
+    sample_size: int  # 抽样分析的轮次数
+    population: int  # 总轮次数
+    confidence: float = 0.95
+
+
+@dataclass
+class StratumCounts:
+    """
+    一个层标签下可直接相加的计数
+
+    ``position``/``length`` 分层在每个对话内独立抽取固定数量的轮次，入样概率 k/N 随对话而变，
+    因此以（对话, 层）为单元先算出 N·p 和 N²·Var(p)，再跨对话相加；
+    没有任何抽样轮次的单元不计入 ``covered``，估计时按已覆盖的总体重新归一化。
+    等概率的 ``POOLED_STRATUM`` 只累计总体、抽样和幻觉轮次数，估计时整体作为一层。
+    """
+    population: int = 0
+    sampled: int = 0
+    positives: int = 0
+    covered: int = 0  # 有抽样轮次的单元的总体轮次数
+    weighted: float = 0.0  # Σ 单元总体 × 单元幻觉比例
+    variance: float = 0.0  # Σ 单元总体² × 单元比例的方差
+
+    def add_cell(self, population: int, sampled: int, positives: int):
+        """累加一个对话内的分层单元"""
+        self.population += population
+        self.sampled += sampled
+        self.positives += positives
+        if sampled == 0:
+            return
+        self.covered += population
+        self.weighted += population * positives / sampled
+        p_adj = (positives + _CELL_PSEUDO_COUNT) / (sampled + 2 * _CELL_PSEUDO_COUNT)
+        fpc = (population - sampled) / (population - 1) if population > 1 else 0.0
+        self.variance += population ** 2 * p_adj * (1 - p_adj) / sampled * fpc
+
+    def merge(self, other: "StratumCounts"):
+        self.population += other.population
+        self.sampled += other.sampled
+        self.positives += other.positives
+        self.covered += other.covered
+        self.weighted += other.weighted
+        self.variance += other.variance
+
+
+class TurnSampler:
+    """轮次抽样器
+
+    支持的策略：
+    - ``uniform``: 每个轮次以相同概率独立抽样
+    - ``position``: 按轮次在对话中的位置分层（前段/中段/后段...），每层按比例抽样
+    - ``length``: 按对话长度分层，不同长度区间可使用不同抽样率
+
+    分层策略在每个对话内按比例取整抽取，短对话的轮次入样概率更高，
+    估计时按对话内的单元加权（见 ``StratumCounts``）。
+    """
+
+    STRATEGIES = ("uniform", "position", "length")
+
+    def __init__(self, rate: float = 0.1, strategy: str = "uniform",
+                 strata: int = 4, min_per_stratum: int = 1,
+                 length_buckets: Tuple[int, ...] = (10, 50, 200),
+                 length_rates: Optional[Dict[str, float]] = None,
+                 seed: Optional[int] = None):
+        """
+        初始化抽样器
+
+        Args:
+            rate: 抽样率 (0.0-1.0]
+            strategy: 抽样策略，见 ``STRATEGIES``
+            strata: ``position`` 策略下的分层数
+            min_per_stratum: 分层策略下每层至少抽取的轮次数
+            length_buckets: ``length`` 策略下对话长度（轮次数）的分段上界
+            length_rates: ``length`` 策略下各长度层的抽样率，键为层标签，缺省使用 ``rate``
+            seed: 随机种子，便于复现
+        """
+        if strategy not in self.STRATEGIES:
+            raise ValueError(f"未知的抽样策略: {strategy}")
+        if not 0.0 < rate <= 1.0:
+            raise ValueError(f"抽样率必须在 (0, 1] 之间: {rate}")
+        self.rate = rate
+        self.strategy = strategy
+        self.strata = max(1, strata)
+        self.min_per_stratum = max(0, min_per_stratum)
+        self.length_buckets = tuple(sorted(length_buckets))
+        self.length_rates = length_rates or {}
+        self.rng = random.Random(seed)
+
+    def stratify(self, turn_ids: List[int]) -> Dict[int, str]:
+        """为每个轮次分配分层标签"""
+        if self.strategy == "position":
+            total = len(turn_ids)
+            return {
+                turn_id: f"pos:{idx * self.strata // total}"
+                for idx, turn_id in enumerate(turn_ids)
+            }
+        if self.strategy == "length":
+            label = self._length_label(len(turn_ids))
+            return {turn_id: label for turn_id in turn_ids}
+        return {turn_id: POOLED_STRATUM for turn_id in turn_ids}
+
+    def select(self, turn_ids: List[int]) -> Tuple[Set[int], Dict[int, str]]:
+        """
+        选出需要完整分析的轮次
+
+        Returns:
+            (被抽中的轮次ID集合, 每个轮次的分层标签)
+        """
+        labels = self.stratify(turn_ids)
+        if self.strategy == "uniform":
+            selected = {t for t in turn_ids if self.rng.random() < self.rate}
+            return selected, labels
+
+        groups: Dict[str, List[int]] = {}
+        for turn_id in turn_ids:
+            groups.setdefault(labels[turn_id], []).append(turn_id)
+
+        selected = set()
+        for label, members in groups.items():
+            rate = self.length_rates.get(label, self.rate)
+            k = max(min(self.min_per_stratum, len(members)), round(rate * len(members)))
+            selected.update(self.rng.sample(members, k))
+        return selected, labels
+
+    def _length_label(self, num_turns: int) -> str:
+        for bound in self.length_buckets:
+            if num_turns <= bound:
+                return f"len:<={bound}"
+        return f"len:>{self.length_buckets[-1]}" if self.length_buckets else "len:all"
+
+
+class ReservoirSampler:
+    """蓄水池抽样：在长度未知的流上维护大小为k的均匀样本"""
+
+    def __init__(self, k: int, seed: Optional[int] = None):
+        if k <= 0:
+            raise ValueError(f"蓄水池大小必须为正数: {k}")
+        self.k = k
+        self.seen = 0
+        self.items: List = []
+        self.rng = random.Random(seed)
+
+    def offer(self, item) -> None:
+        """向蓄水池提交一个元素"""
+        self.seen += 1
+        if len(self.items) < self.k:
+            self.items.append(item)
+            return
+        j = self.rng.randrange(self.seen)
+        if j < self.k:
+            self.items[j] = item
+
+
+def iter_turn_ids(dialogue_data: Dict) -> Iterable[int]:
+    """按 ``LLMMemoryAnalyzer`` 的配对规则遍历对话中的有效轮次ID"""
+    turns = dialogue_data.get("turns", [])
+    for i in range(0, len(turns) - 1, 2):
+        if turns[i].get("role") == "user" and turns[i + 1].get("role") == "assistant":
+            yield i // 2 + 1
+
+
+def reservoir_sample_turns(dialogues: Iterable[Dict], k: int,
+                           seed: Optional[int] = None) -> Dict[int, Set[int]]:
+    """
+    对流式输入的语料做轮次级蓄水池抽样（单遍扫描，内存O(k)）
+
+    Args:
+        dialogues: 对话数据的可迭代对象（可以是生成器）
+        k: 需要抽取的轮次总数
+        seed: 随机种子
+
+    Returns:
+        {对话在流中的序号: 被抽中的轮次ID集合}
+    """
+    reservoir = ReservoirSampler(k, seed=seed)
+    for dialogue_index, dialogue_data in enumerate(dialogues):
+        for turn_id in iter_turn_ids(dialogue_data):
+            reservoir.offer((dialogue_index, turn_id))
+
+    selection: Dict[int, Set[int]] = {}
+    for dialogue_index, turn_id in reservoir.items:
+        selection.setdefault(dialogue_index, set()).add(turn_id)
+    return selection
+
+
+def stratum_counts(states: Iterable[MemoryState],
+                   hallucination_type: Optional[HallucinationType] = None) -> Dict[str, StratumCounts]:
+    """
+    按分层统计总体轮次数、抽样分析轮次数和出现幻觉的轮次数
+
+    各项计数都可以直接相加，跨对话、跨进程合并（``StratumCounts.merge``）后仍可用于 ``estimate_rate``。
+
+    Returns:
+        {层标签: 计数}
+    """
+    totals: Dict[str, StratumCounts] = {}
+    for state in states:
+        labels = state.turn_strata
+        cells: Dict[str, List[int]] = {}  # {层标签: [总体, 抽样, 幻觉]}
+        for label in labels.values():
+            cells.setdefault(label, [0, 0, 0])[0] += 1
+        for turn in state.turns:
+            cell = cells.setdefault(labels.get(turn.turn_id, POOLED_STRATUM), [0, 0, 0])
+            if not labels:
+                cell[0] += 1
+            cell[1] += 1
+            if any(hallucination_type is None or h.type == hallucination_type
+                   for h in turn.hallucinations):
+                cell[2] += 1
+        for label, (population, sampled, positives) in cells.items():
+            totals.setdefault(label, StratumCounts()).add_cell(population, sampled, positives)
+    return totals
+
+
+def estimate_hallucination_rate(states: Iterable[MemoryState],
+                                hallucination_type: Optional[HallucinationType] = None,
+                                confidence: float = 0.95) -> RateEstimate:
+    """
+    估计"至少出现一次幻觉的轮次"所占比例
+
+    Args:
+        states: 一个或多个对话的分析结果
+        hallucination_type: 只统计某一类幻觉，None表示全部
+        confidence: 置信水平
+    """
+    return estimate_rate(stratum_counts(states, hallucination_type), confidence=confidence)
+
+
+def estimate_rate(strata: Dict[str, StratumCounts], confidence: float = 0.95) -> RateEstimate:
+    """
+    由分层计数估计比例
+
+    只有等概率层时使用带有限总体校正的Wilson区间；否则对各单元按总体大小加权，
+    使用正态近似的分层估计。没有抽样轮次的单元不参与加权，权重按已覆盖的总体重新归一化。
+    全量分析时区间退化为点估计。
+    """
+    z = _Z_SCORES.get(confidence)
+    if z is None:
+        raise ValueError(f"不支持的置信水平: {confidence}")
+
+    total_population = sum(s.population for s in strata.values())
+    total_sampled = sum(s.sampled for s in strata.values())
+    if total_sampled == 0:
+        return RateEstimate(0.0, 0.0, 1.0, 0, total_population, confidence)
+
+    if set(strata) == {POOLED_STRATUM}:
+        pooled = strata[POOLED_STRATUM]
+        lower, upper, rate = _wilson(pooled.positives, pooled.sampled, pooled.population, z)
+        return RateEstimate(rate, lower, upper, total_sampled, total_population, confidence)
+
+    covered = 0
+    weighted = 0.0
+    variance = 0.0
+    for label, counts in strata.items():
+        if label != POOLED_STRATUM:
+            covered += counts.covered
+            weighted += counts.weighted
+            variance += counts.variance
+            continue
+        n = counts.sampled
+        if n == 0:
+            continue
+        size = counts.population
+        x = counts.positives
+        # 方差使用Agresti-Coull修正后的比例，避免小样本层 p=0/1 时区间退化为零宽
+        p_adj = (x + z ** 2 / 2) / (n + z ** 2)
+        fpc = (size - n) / (size - 1) if size > 1 else 0.0
+        covered += size
+        weighted += size * x / n
+        variance += size ** 2 * p_adj * (1 - p_adj) / n * fpc
+    rate = weighted / covered
+    margin = z * math.sqrt(variance) / covered
+    return RateEstimate(rate, max(0.0, rate - margin), min(1.0, rate + margin),
+                        total_sampled, total_population, confidence)
+
+
+def _wilson(successes: int, n: int, population: int, z: float) -> Tuple[float, float, float]:
+    """Wilson得分区间，样本量用有限总体校正后的有效样本量"""
+    p = successes / n
+    if population > n and population > 1:
+        n_eff = n * (population - 1) / (population - n)
+    else:
+        # 全量分析，没有抽样误差
+        return p, p, p
+    denom = 1 + z ** 2 / n_eff
+    center = (p + z ** 2 / (2 * n_eff)) / denom
+    margin = z * math.sqrt(p * (1 - p) / n_eff + z ** 2 / (4 * n_eff ** 2)) / denom
+    return max(0.0, center - margin), min(1.0, center + margin), p
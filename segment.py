@@ -0,0 +1,196 @@
+"""中文分词与关键词提取模块
+
+提供可替换的轻量分词器（内置词典正向最大匹配、n-gram两种模式，不需要下载任何资源），
+以及带LRU缓存和停用词过滤的关键词提取器。同一条记忆在每一轮匹配时都要提取关键词，
+缓存后每条文本只需分词一次。
+"""
+
+import re
+from collections import OrderedDict
+from typing import Iterable, List, Optional, Tuple
+
+
+# 停用词：人称、虚词、常见动词/副词，以及记忆内容中的模板标签（如"用户姓名: 张三"中的标签）
+STOP_WORDS = frozenset("""
+我 你 他 她 它 的 地 得 了 着 过 是 在 有 和 与 及 或 很 也 都 就 还 又 再 才 吗 呢 吧 啊 呀 哦 嗯
+个 这 那 哪 谁 不 没 别 会 要 想 能 可 叫 说 对 把 被 让 给 从 到 为 以 于 而 好 去 来 上 下 里 中
+我们 你们 他们 她们 它们 我的 你的 自己 大家
+这个 那个 哪个 这些 那些 一个 一些 一下 一点 什么 怎么 怎样 为什么 多少 哪里 那里 这里
+你好 您好 谢谢 请问 抱歉 不好意思 当然 好的 是的 没有 不是 可以 能够 需要 应该 知道 觉得 认为
+记得 还记得 记住 告诉 提到 说过 之前 以前 刚才 现在 今天 一直 已经 还是 或者 然后 但是 因为 所以
+如果 虽然 而且 并且 非常 特别 比较 真的 其实 一起 这样 那样 怎么样 帮助 帮忙 回忆 很高兴 认识
+用户 姓名 名字 来自 喜欢 爱好 兴趣 年龄 职业 工作
+""".split())
+
+ENGLISH_STOP_WORDS = frozenset("""
+a an the and or but if of to in on at by for with from as is are was were be been am
+i you he she it we they me my your his her its our their this that these those
+do does did not no so too very can will just
+""".split())
+
+# 单字停用词不进入词典，否则会把"阿里巴巴"这样的未登录实体从中间切开（"阿/里/巴巴"），
+# 只在未登录字串的两端剥离（见 MaxMatchSegmenter）
+_SINGLE_STOP_CHARS = frozenset(w for w in STOP_WORDS if len(w) == 1)
+
+# 内置词典：常用词语，供正向最大匹配切分；多字停用词也参与切分，用于切断未登录词
+BUILTIN_WORDS = frozenset(w for w in STOP_WORDS if len(w) > 1) | frozenset("""
+城市 地方 国家 家乡 公司 学校 大学 专业 学生 老师 工程师 医生 程序员 设计师 经理
+编程 编程语言 语言 代码 开发 软件 学习 机器学习 深度学习 人工智能 数据 数据分析 算法 模型 项目
+领域 方面 方向 问题 方法 例子 比如 优秀 有趣 简洁 易读 适合 开始 了解 介绍 推荐 建议
+音乐 电影 运动 旅行 阅读 美食 游戏 篮球 足球 跑步 唱歌 画画 摄影 咖啡
+北京 上海 广州 深圳 杭州 成都 南京 武汉 西安 重庆 天津 苏州 乌鲁木齐 新疆 香港 台湾
+""".split())
+
+_CJK_RUN = re.compile(r"[\u4e00-\u9fa5]+")
+_ENGLISH_WORD = re.compile(r"(?<![A-Za-z])[A-Za-z]{2,}(?![A-Za-z])")
+
+
+def find_keyword(text: str, keyword: str) -> int:
+    """
+    在小写文本中查找关键词，返回位置，找不到时返回-1
+
+    英文关键词按单词边界匹配（"go"不匹配"good"），中文关键词按子串匹配。
+    """
+    if not keyword.isascii():
+        return text.find(keyword)
+    match = re.search(rf"(?<![a-z]){re.escape(keyword)}(?![a-z])", text)
+    return match.start() if match else -1
+
+
+class MaxMatchSegmenter:
+    """
+    词典正向最大匹配分词器，连续的未登录单字合并为一个词（通常是人名、地名等实体）
+
+    未登录字串两端的单字停用词（"我叫张三"中的"我""叫"）单独切出，中间的保留在实体内。
+    """
+
+    def __init__(self, words: Optional[Iterable[str]] = None, max_word_len: Optional[int] = None):
+        """
+        Args:
+            words: 额外的自定义词语，与内置词典合并
+            max_word_len: 最大匹配长度，默认取词典中最长词的长度
+        """
+        self.words = set(BUILTIN_WORDS)
+        if words:
+            self.words.update(w.strip() for w in words if w.strip())
+        self.max_word_len = max_word_len or max(len(w) for w in self.words)
+
+    def segment(self, text: str) -> List[str]:
+        tokens = []
+        for run in _CJK_RUN.findall(text):
+            unknown = []
+            i = 0
+            while i < len(run):
+                for size in range(min(self.max_word_len, len(run) - i), 0, -1):
+                    piece = run[i:i + size]
+                    if piece in self.words:
+                        break
+                else:
+                    # 未登录的单字，暂存等待与相邻未登录字合并
+                    unknown.append(run[i])
+                    i += 1
+                    continue
+                if unknown:
+                    tokens.extend(_split_stop_edges("".join(unknown)))
+                    unknown = []
+                tokens.append(piece)
+                i += size
+            if unknown:
+                tokens.extend(_split_stop_edges("".join(unknown)))
+        return tokens
+
+
+def _split_stop_edges(run: str) -> List[str]:
+    """把未登录字串两端的单字停用词切成单独的词"""
+    start, end = 0, len(run)
+    while start < end and run[start] in _SINGLE_STOP_CHARS:
+        start += 1
+    while end > start and run[end - 1] in _SINGLE_STOP_CHARS:
+        end -= 1
+    return list(run[:start]) + ([run[start:end]] if start < end else []) + list(run[end:])
+
+
+class NGramSegmenter:
+    """n-gram分词器：先在停用词处切开每段连续汉字，再输出重叠的n字片段，不依赖内容词典"""
+
+    def __init__(self, n: int = 2, stop_words: Iterable[str] = STOP_WORDS):
+        self.n = n
+        self.stop_words = frozenset(stop_words)
+        self._max_stop_len = max((len(w) for w in self.stop_words), default=1)
+
+    def segment(self, text: str) -> List[str]:
+        tokens = []
+        for run in _CJK_RUN.findall(text):
+            for piece in self._split_on_stop_words(run):
+                if len(piece) <= self.n:
+                    tokens.append(piece)
+                    continue
+                tokens.extend(piece[i:i + self.n] for i in range(len(piece) - self.n + 1))
+        return tokens
+
+    def _split_on_stop_words(self, run: str) -> List[str]:
+        """正向最大匹配找出停用词，返回停用词之间的片段"""
+        pieces = []
+        start = i = 0
+        while i < len(run):
+            for size in range(min(self._max_stop_len, len(run) - i), 0, -1):
+                if run[i:i + size] in self.stop_words:
+                    break
+            else:
+                i += 1
+                continue
+            if i > start:
+                pieces.append(run[start:i])
+            i += size
+            start = i
+        if start < len(run):
+            pieces.append(run[start:])
+        return pieces
+
+
+SEGMENTERS = {"dict": MaxMatchSegmenter, "ngram": NGramSegmenter}
+
+
+class KeywordExtractor:
+    """带LRU缓存的关键词提取器"""
+
+    def __init__(self, segmenter=None, stop_words: Iterable[str] = STOP_WORDS,
+                 cache_size: int = 4096):
+        """
+        Args:
+            segmenter: 分词器，需要实现 segment(text) -> List[str]，默认使用词典最大匹配
+            stop_words: 停用词
+            cache_size: 缓存的文本条数
+        """
+        self.segmenter = segmenter or MaxMatchSegmenter()
+        self.stop_words = frozenset(stop_words)
+        self.cache_size = cache_size
+        self._cache: "OrderedDict[str, Tuple[str, ...]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def extract(self, text: str) -> Tuple[str, ...]:
+        """提取关键词（去重、保持出现顺序），英文统一为小写"""
+        cached = self._cache.get(text)
+        if cached is not None:
+            self._cache.move_to_end(text)
+            self.hits += 1
+            return cached
+        self.misses += 1
+        keywords = self._extract(text)
+        self._cache[text] = keywords
+        if len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+        return keywords
+
+    def _extract(self, text: str) -> Tuple[str, ...]:
+        keywords = []
+        for token in self.segmenter.segment(text):
+            if len(token) < 2 or token in self.stop_words:
+                continue
+            keywords.append(token)
+        for word in _ENGLISH_WORD.findall(text):
+            word = word.lower()
+            if word not in ENGLISH_STOP_WORDS:
+                keywords.append(word)
+        return tuple(dict.fromkeys(keywords))
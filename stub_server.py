@@ -0,0 +1,223 @@
+"""本地替身服务模块
+
+一个只依赖标准库的OpenAI兼容接口替身服务，返回固定的空分析结果，
+同时像带前缀缓存的推理服务一样统计Prompt前缀复用情况，并统计TCP连接数和
+同时在途的请求数（连续批处理可合并的并发度），便于离线验证前缀稳定布局、
+长连接复用和并发请求等优化的效果。
+
+支持的接口: /v1/chat/completions（含stream）、/v1/completions（prompt可为数组）。
+
+用法:
+    python -m WhatDidYouRemember.stub_server --port 8080
+    curl http://127.0.0.1:8080/stats
+"""
+
+import argparse
+import json
+import threading
+import time
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict
+
+from .prompt import common_prefix_len
+
+
+_ANALYSIS_REPLY = {"used_memories": [], "missed_memories": [], "hallucinations": []}
+_EXTRACTION_REPLY = {"memories": []}
+
+
+class StubState:
+    """替身服务的共享状态"""
+
+    def __init__(self, cache_size: int = 32, latency: float = 0.0):
+        self.lock = threading.Lock()
+        self.cached_prompts = deque(maxlen=cache_size)  # 模拟服务端的前缀缓存
+        self.latency = latency  # 每个HTTP请求的模拟生成耗时（秒）
+        self.in_flight = 0
+        self.stats = {"requests": 0, "prompt_chars": 0, "reused_chars": 0,
+                      "connections": 0, "http_requests": 0, "max_in_flight": 0}
+
+    def observe(self, prompt: str) -> int:
+        """记录一个Prompt，返回它与缓存中任一Prompt的最长公共前缀长度"""
+        with self.lock:
+            reused = max((common_prefix_len(cached, prompt) for cached in self.cached_prompts),
+                         default=0)
+            self.cached_prompts.append(prompt)
+            self.stats["requests"] += 1
+            self.stats["prompt_chars"] += len(prompt)
+            self.stats["reused_chars"] += reused
+            return reused
+
+    def count(self, key: str, amount: int = 1):
+        with self.lock:
+            self.stats[key] += amount
+
+    def enter(self):
+        """记录一个开始处理的请求"""
+        with self.lock:
+            self.stats["http_requests"] += 1
+            self.in_flight += 1
+            self.stats["max_in_flight"] = max(self.stats["max_in_flight"], self.in_flight)
+
+    def leave(self):
+        with self.lock:
+            self.in_flight -= 1
+
+    def snapshot(self) -> Dict:
+        with self.lock:
+            stats = dict(self.stats)
+        stats["reuse_ratio"] = (stats["reused_chars"] / stats["prompt_chars"]
+                                if stats["prompt_chars"] else 0.0)
+        return stats
+
+
+def _reply_for(prompt: str) -> str:
+    """根据Prompt类型返回固定的JSON结果"""
+    reply = _EXTRACTION_REPLY if "提取" in prompt and "memories" in prompt else _ANALYSIS_REPLY
+    return json.dumps(reply, ensure_ascii=False)
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    """OpenAI兼容接口的请求处理器"""
+
+    protocol_version = "HTTP/1.1"  # 支持keep-alive长连接
+
+    def setup(self):
+        # 每个处理器实例对应一条TCP连接
+        super().setup()
+        self.server.state.count("connections")
+
+    def do_GET(self):
+        if self.path == "/stats":
+            self._send_json(self.server.state.snapshot())
+        elif self.path == "/v1/models":
+            self._send_json({"object": "list", "data": [{"id": "stub", "object": "model"}]})
+        else:
+            self._send_json({"error": "not found"}, status=404)
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        try:
+            body = json.loads(self.rfile.read(length) or b"{}")
+        except json.JSONDecodeError:
+            self._send_json({"error": "invalid json"}, status=400)
+            return
+
+        state = self.server.state
+        state.enter()
+        try:
+            self._handle_post(state, body)
+        finally:
+            state.leave()
+
+    def _handle_post(self, state: StubState, body: Dict):
+        if state.latency:
+            time.sleep(state.latency)
+
+        if self.path == "/v1/chat/completions":
+            prompt = "".join(_message_text(m) for m in body.get("messages", []))
+            state.observe(prompt)
+            if body.get("stream"):
+                self._send_chat_stream(body.get("model", "stub"), _reply_for(prompt))
+                return
+            self._send_json({
+                "object": "chat.completion",
+                "model": body.get("model", "stub"),
+                "choices": [{
+                    "index": 0,
+                    "message": {"role": "assistant", "content": _reply_for(prompt)},
+                    "finish_reason": "stop"
+                }]
+            })
+        elif self.path == "/v1/completions":
+            prompts = body.get("prompt", "")
+            if isinstance(prompts, str):
+                prompts = [prompts]
+            for prompt in prompts:
+                state.observe(prompt)
+            self._send_json({
+                "object": "text_completion",
+                "model": body.get("model", "stub"),
+                "choices": [
+                    {"index": i, "text": _reply_for(prompt), "finish_reason": "stop"}
+                    for i, prompt in enumerate(prompts)
+                ]
+            })
+        else:
+            self._send_json({"error": "not found"}, status=404)
+
+    def _send_chat_stream(self, model: str, text: str, chunk_chars: int = 16):
+        """以SSE分块传输流式返回，连接在流结束后仍可复用"""
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream; charset=utf-8")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        try:
+            for start in range(0, len(text), chunk_chars):
+                chunk = {
+                    "object": "chat.completion.chunk",
+                    "model": model,
+                    "choices": [{"index": 0, "delta": {"content": text[start:start + chunk_chars]}}]
+                }
+                self._write_chunk(f"data: {json.dumps(chunk, ensure_ascii=False)}\n\n")
+            self._write_chunk("data: [DONE]\n\n")
+            self.wfile.write(b"0\r\n\r\n")
+        except (BrokenPipeError, ConnectionResetError):
+            # 客户端提前停止读取并关闭了连接，相当于中断生成
+            self.close_connection = True
+
+    def _write_chunk(self, text: str):
+        data = text.encode("utf-8")
+        self.wfile.write(f"{len(data):x}\r\n".encode("ascii") + data + b"\r\n")
+
+    def _send_json(self, data: Dict, status: int = 200):
+        payload = json.dumps(data, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, format, *args):
+        # 不逐条打印访问日志，保持命令行和 tests/ 的输出干净
+        pass
+
+
+def _message_text(message: Dict) -> str:
+    """取出消息文本，兼容字符串和分块（带缓存断点）两种content格式"""
+    content = message.get("content", "")
+    if isinstance(content, list):
+        return "".join(part.get("text", "") for part in content)
+    return content
+
+
+def create_server(host: str = "127.0.0.1", port: int = 8080,
+                  cache_size: int = 32, latency: float = 0.0) -> ThreadingHTTPServer:
+    """创建替身服务（port为0时自动分配端口），调用方负责serve_forever/shutdown"""
+    server = ThreadingHTTPServer((host, port), StubHandler)
+    server.daemon_threads = True
+    server.state = StubState(cache_size=cache_size, latency=latency)
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description="WhatDidYouRemember 本地替身服务")
+    parser.add_argument("--host", default="127.0.0.1", help="监听地址 (默认: 127.0.0.1)")
+    parser.add_argument("--port", type=int, default=8080, help="监听端口 (默认: 8080)")
+    parser.add_argument("--latency", type=float, default=0.0,
+                        help="每个请求的模拟生成耗时（秒） (默认: 0)")
+    args = parser.parse_args()
+
+    server = create_server(args.host, args.port, latency=args.latency)
+    print(f"替身服务已启动: http://{args.host}:{server.server_address[1]}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,41 @@
+"""测试共用的对话分析结果构造"""
+
+from typing import List, Optional, Tuple
+
+import pytest
+
+from WhatDidYouRemember.hallucination import Hallucination, HallucinationType
+from WhatDidYouRemember.memory_state import MemoryState, TurnAnalysis
+from WhatDidYouRemember.sampling import TurnSampler
+
+
+def build_states(dialogues: List[Tuple[int, bool]],
+                 sampler: Optional[TurnSampler] = None) -> List[MemoryState]:
+    """
+    按 [(轮次数, 是否每轮都有幻觉)] 构造分析结果，给出sampler时只有抽中的轮次被分析
+    """
+    states = []
+    for length, hallucinated in dialogues:
+        state = MemoryState()
+        turn_ids = list(range(1, length + 1))
+        selected = set(turn_ids)
+        if sampler is not None:
+            selected, strata = sampler.select(turn_ids)
+            state.turn_strata.update(strata)
+        for turn_id in turn_ids:
+            if turn_id not in selected:
+                state.skipped_turns.append(turn_id)
+                continue
+            analysis = TurnAnalysis(turn_id, "用户输入", "LLM回复")
+            if hallucinated:
+                analysis.hallucinations.append(Hallucination(
+                    HallucinationType.FABRICATED_MEMORY, turn_id, "虚构的记忆", "证据", 0.6
+                ))
+            state.record_turn(analysis)
+        states.append(state)
+    return states
+
+
+@pytest.fixture
+def make_states():
+    return build_states
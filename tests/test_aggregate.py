@@ -0,0 +1,57 @@
+"""语料级聚合的合并测试"""
+
+import json
+
+import pytest
+
+from WhatDidYouRemember.aggregate import CorpusAggregate, SpaceSaving
+from WhatDidYouRemember.sampling import TurnSampler, estimate_hallucination_rate
+
+
+def test_space_saving_merge_is_exact_below_capacity():
+    left, right = SpaceSaving(capacity=10), SpaceSaving(capacity=10)
+    for item, count in [("a", 5), ("b", 2)]:
+        left.add(item, count)
+    for item, count in [("a", 1), ("c", 4)]:
+        right.add(item, count)
+    left.merge(right)
+    assert left.top(3) == [("a", 6, 0), ("c", 4, 0), ("b", 2, 0)]
+
+
+def test_space_saving_merge_keeps_heavy_hitter_within_error():
+    left, right = SpaceSaving(capacity=3), SpaceSaving(capacity=3)
+    for sketch, offset in ((left, 0), (right, 100)):
+        for i in range(20):
+            sketch.add("热点")
+            sketch.add(f"噪声{offset + i}")
+    left.merge(SpaceSaving.from_dict(right.to_dict()))
+    item, count, error = left.top(1)[0]
+    assert item == "热点"
+    assert count - error <= 40 <= count
+    assert len(left.counts) <= 3
+
+
+def test_corpus_aggregate_merge_matches_single_pass(make_states):
+    sampler = TurnSampler(rate=0.25, strategy="position", seed=1)
+    states = make_states([(4, True)] * 6 + [(40, False)] * 6, sampler)
+
+    single = CorpusAggregate()
+    for state in states:
+        single.add_state(state)
+
+    parts = [CorpusAggregate(), CorpusAggregate()]
+    for i, state in enumerate(states):
+        parts[i % 2].add_state(state)
+    merged = parts[0]
+    # 模拟worker进程之间经JSON传递结果
+    merged.merge(CorpusAggregate.from_dict(json.loads(json.dumps(parts[1].to_dict()))))
+
+    assert merged.dialogues == single.dialogues == 12
+    assert merged.turns == single.turns
+    assert merged.hallucination_counts == single.hallucination_counts
+    assert merged.severity_histogram == single.severity_histogram
+    expected = estimate_hallucination_rate(states)
+    for estimate in (merged.hallucination_rate(), single.hallucination_rate()):
+        assert (estimate.rate, estimate.lower, estimate.upper) == pytest.approx(
+            (expected.rate, expected.lower, expected.upper))
+        assert (estimate.sample_size, estimate.population) == (expected.sample_size, expected.population)
@@ -0,0 +1,57 @@
+"""分析器预算降级的测试"""
+
+import json
+
+from WhatDidYouRemember.analyzer import LLMMemoryAnalyzer
+from WhatDidYouRemember.budget import AnalysisBudget, estimate_tokens
+
+
+_EMPTY_ANALYSIS = json.dumps({"used_memories": [], "missed_memories": [], "hallucinations": []})
+
+
+class RecordingClient:
+    """返回空分析结果，记录每次调用的Prompt和timeout"""
+
+    def __init__(self):
+        self.prompts = []
+        self.timeouts = []
+
+    def call(self, prompt, timeout=None):
+        self.prompts.append(prompt)
+        self.timeouts.append(timeout)
+        return '{"memories": []}' if "提取" in prompt else _EMPTY_ANALYSIS
+
+
+def _dialogue(turns: int) -> dict:
+    items = []
+    for i in range(1, turns + 1):
+        items.append({"role": "user", "content": f"第{i}个问题：我叫张三，我喜欢第{i}种水果。"})
+        items.append({"role": "assistant", "content": f"第{i}种水果很好吃。"})
+    return {"turns": items}
+
+
+def test_truncated_history_fits_token_budget():
+    client = RecordingClient()
+    budget = AnalysisBudget(max_prompt_tokens=8000)
+    analyzer = LLMMemoryAnalyzer(llm_client=client, budget=budget, prompt_layout="prefix_stable")
+    state = analyzer.analyze_dialogue(_dialogue(12))
+
+    # 截断后的Prompt按实际渲染估算，预留调用必然成功
+    notes = [note for notes in state.degraded_turns.values() for note in notes]
+    assert any(note.startswith("历史截断") for note in notes)
+    assert sum(estimate_tokens(p) for p in client.prompts) == analyzer.budget_tracker.prompt_tokens
+    assert analyzer.budget_tracker.prompt_tokens <= budget.max_prompt_tokens
+
+
+def test_deadline_is_passed_as_client_timeout():
+    client = RecordingClient()
+    analyzer = LLMMemoryAnalyzer(llm_client=client, budget=AnalysisBudget(deadline_seconds=30))
+    analyzer.analyze_dialogue(_dialogue(2))
+    assert client.timeouts
+    assert all(0 < timeout <= 30 for timeout in client.timeouts)
+
+
+def test_no_timeout_without_deadline():
+    client = RecordingClient()
+    LLMMemoryAnalyzer(llm_client=client).analyze_dialogue(_dialogue(2))
+    assert client.timeouts == [None] * len(client.prompts)
@@ -0,0 +1,48 @@
+"""增量JSON解析的测试"""
+
+from WhatDidYouRemember.json_stream import IncrementalJSONParser, parse_json_response
+
+
+KEYS = ["used_memories"]
+
+
+def _feed_in_chunks(text: str, size: int = 3) -> IncrementalJSONParser:
+    parser = IncrementalJSONParser()
+    for start in range(0, len(text), size):
+        if parser.feed(text[start:start + size]):
+            break
+    return parser
+
+
+def test_parser_skips_braces_in_leading_prose():
+    text = 'Sure {a} here: ```json\n{"used_memories": [{"memory_id": 1}]}\n``` trailing {'
+    parser = _feed_in_chunks(text)
+    assert parser.complete
+    assert parser.object_text() == '{"used_memories": [{"memory_id": 1}]}'
+
+
+def test_parser_ignores_braces_inside_strings():
+    parser = _feed_in_chunks('{"evidence": "括号}不算", "n": [1, {"m": 2}]} 之后的说明')
+    assert parser.object_text() == '{"evidence": "括号}不算", "n": [1, {"m": 2}]}'
+
+
+def test_parse_with_prose_and_fence():
+    text = 'Sure {a} here: ```json\n{"used_memories": [{"memory_id": 1}]}\n```'
+    assert parse_json_response(text, KEYS) == ({"used_memories": [{"memory_id": 1}]}, True)
+
+
+def test_parse_unclosed_prose_candidate_falls_back_to_fence():
+    text = 'It\'s {"x here: ```json\n{"used_memories": []}\n```'
+    assert parse_json_response(text, KEYS) == ({"used_memories": []}, True)
+
+
+def test_parse_truncated_salvages_complete_items():
+    text = '```json\n{"used_memories": [{"memory_id": 1}, {"memory_id": 2}, {"memory_'
+    result, complete = parse_json_response(text, KEYS)
+    assert not complete
+    assert result == {"used_memories": [{"memory_id": 1}, {"memory_id": 2}]}
+
+
+def test_parse_nothing_salvaged():
+    assert parse_json_response('{"used_memories": [{"memory_', KEYS) == (None, False)
+    assert parse_json_response("没有JSON", KEYS) == (None, False)
@@ -0,0 +1,73 @@
+"""本地模型客户端与替身服务的测试"""
+
+import threading
+
+import pytest
+
+from WhatDidYouRemember.local_client import LocalLLMClient, LocalLLMError
+from WhatDidYouRemember.prompt import common_prefix_len
+from WhatDidYouRemember.stub_server import create_server
+
+
+@pytest.fixture
+def server():
+    server = create_server(port=0, latency=0.02)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def _client(server, **kwargs) -> LocalLLMClient:
+    host, port = server.server_address[:2]
+    return LocalLLMClient(base_url=f"http://{host}:{port}", timeout=5, **kwargs)
+
+
+def test_prefix_reuse_is_counted(server):
+    first = "固定说明。" * 20 + "轮次 1"
+    second = "固定说明。" * 20 + "轮次 2"
+    client = _client(server)
+    client.call(first)
+    client.call(second)
+    client.close()
+    stats = server.state.snapshot()
+    assert stats["requests"] == 2
+    assert stats["reused_chars"] >= common_prefix_len(first, second)
+    assert stats["reuse_ratio"] > 0.4
+
+
+def test_sequential_calls_reuse_one_connection(server):
+    client = _client(server)
+    for i in range(5):
+        client.call(f"提示 {i}")
+    client.close()
+    stats = server.state.snapshot()
+    assert stats["http_requests"] == 5
+    assert stats["connections"] == 1
+
+
+def test_call_many_runs_concurrently_within_pool(server):
+    client = _client(server, pool_size=4)
+    replies = client.call_many([f"提示 {i}" for i in range(8)])
+    client.close()
+    assert len(replies) == 8
+    stats = server.state.snapshot()
+    assert 1 < stats["max_in_flight"] <= 4
+    assert stats["connections"] <= 4
+
+
+def test_stream_returns_full_reply_and_keeps_connection(server):
+    client = _client(server)
+    text = "".join(client.stream("分析"))
+    client.call("分析")
+    client.close()
+    assert text.startswith('{"used_memories"')
+    assert server.state.snapshot()["connections"] == 1
+
+
+def test_closed_client_rejects_calls(server):
+    client = _client(server)
+    client.close()
+    with pytest.raises(LocalLLMError):
+        client.call("提示")
@@ -0,0 +1,24 @@
+"""Prompt布局与历史窗口的测试"""
+
+from WhatDidYouRemember.analyzer import LLMMemoryAnalyzer
+from WhatDidYouRemember.prompt import common_prefix_len, history_window_turns
+
+
+def test_history_window_turns():
+    assert [history_window_turns(t, 4) for t in range(8)] == [0, 1, 2, 3, 4, 4, 4, 4]
+    assert [history_window_turns(t, 4, "prefix_stable") for t in range(10)] == [0, 1, 2, 3, 4, 3, 4, 3, 4, 3]
+    assert history_window_turns(7, None, "prefix_stable") == 7
+
+
+def test_prefix_stable_window_keeps_prefix_within_block():
+    analyzer = LLMMemoryAnalyzer(prompt_layout="prefix_stable", history_window=4)
+    history = []
+    prompts = []
+    for turn_id in range(1, 10):
+        prompts.append(analyzer._build_analysis_prompt(turn_id, f"问题{turn_id}", f"回答{turn_id}", history))
+        history.append({"role": "user", "content": f"问题{turn_id}", "turn_id": turn_id})
+        history.append({"role": "assistant", "content": f"回答{turn_id}", "turn_id": turn_id})
+    # 第6、8轮滑动了窗口，其余各轮以上一轮的缓存前缀原样开头
+    for turn_id in (2, 3, 4, 5, 7, 9):
+        previous = prompts[turn_id - 2]
+        assert common_prefix_len(previous, prompts[turn_id - 1]) == previous.cache_prefix_len
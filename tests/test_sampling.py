@@ -0,0 +1,36 @@
+"""抽样估计的测试"""
+
+import pytest
+
+from WhatDidYouRemember.sampling import TurnSampler, estimate_hallucination_rate
+
+
+# 10个短对话每轮都有幻觉，10个长对话没有：真实的轮次幻觉率为 40 / 440
+UNEQUAL_DIALOGUES = [(4, True)] * 10 + [(40, False)] * 10
+TRUE_RATE = 40 / 440
+
+
+@pytest.mark.parametrize("strategy", ["position", "length", "uniform"])
+def test_estimate_unbiased_on_unequal_dialogue_lengths(make_states, strategy):
+    estimates = [
+        estimate_hallucination_rate(
+            make_states(UNEQUAL_DIALOGUES, TurnSampler(rate=0.25, strategy=strategy, seed=seed))
+        )
+        for seed in range(100)
+    ]
+    mean = sum(e.rate for e in estimates) / len(estimates)
+    coverage = sum(e.lower <= TRUE_RATE <= e.upper for e in estimates) / len(estimates)
+    assert mean == pytest.approx(TRUE_RATE, abs=0.01)
+    assert coverage >= 0.9
+
+
+def test_full_analysis_is_exact(make_states):
+    estimate = estimate_hallucination_rate(make_states(UNEQUAL_DIALOGUES))
+    assert estimate.rate == pytest.approx(TRUE_RATE)
+    assert estimate.lower == estimate.upper == estimate.rate
+    assert estimate.sample_size == estimate.population == 440
+
+
+def test_unsupported_confidence(make_states):
+    with pytest.raises(ValueError):
+        estimate_hallucination_rate(make_states([(4, True)]), confidence=0.5)